@@ -0,0 +1,189 @@
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+
+import joblib
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+try:
+    import fcntl
+except ImportError: # Windows: builds aren't coordinated across processes
+    fcntl = None
+
+# --- Configuration ---
+ARTIFACTS_ROOT = os.getenv(
+    "RECOMMENDER_ARTIFACTS_ROOT",
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'artifacts')
+)
+ARTIFACT_FORMAT_VERSION = 2
+CURRENT_POINTER = 'CURRENT' # File in ARTIFACTS_ROOT naming the version to serve
+MANIFEST_FILE = 'manifest.json'
+BUILD_LOCK_FILE = 'build.lock' # Held by whichever process on the host is fitting and saving a version
+KEEP_PREVIOUS_VERSIONS = 1 # Superseded versions kept besides the one CURRENT points at
+
+
+@contextmanager
+def build_lock(root=ARTIFACTS_ROOT):
+    """
+    Serializes artifact builds across the processes sharing root (API workers
+    refitting stale artifacts, build_artifacts.py), so a catalog change is
+    fitted and saved once rather than once per worker. The OS releases the
+    lock if its holder dies.
+    """
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, BUILD_LOCK_FILE), 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def save_artifacts(recommender, root=ARTIFACTS_ROOT):
+    """
+    Writes the fitted state of a Recommender into a new versioned directory
+    under root and points CURRENT at it. Large arrays are stored as raw .npy
+    files so they can be memory-mapped by every worker on the host.
+    """
+    # The pid keeps versions apart when several workers save a refit in the same second
+    base_version = f"v{ARTIFACT_FORMAT_VERSION}-{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}"
+    version, attempt = base_version, 1
+    while os.path.exists(os.path.join(root, version)):
+        attempt += 1
+        version = f"{base_version}-{attempt}"
+    final_dir = os.path.join(root, version)
+    tmp_dir = final_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    tfidf = recommender.tfidf_matrix.tocsr()
+    arrays = {
+        'tfidf_data': tfidf.data.astype(np.float32),
+        'tfidf_indices': tfidf.indices.astype(np.int32),
+        'tfidf_indptr': tfidf.indptr.astype(np.int64),
+        'neighbor_ids': recommender.neighbor_ids,
+        'neighbor_scores': recommender.neighbor_scores,
+        'deleted': recommender.deleted,
+    }
+    if recommender.embeddings is not None:
+        arrays['embeddings'] = recommender.embeddings
+        joblib.dump(recommender.svd, os.path.join(tmp_dir, 'svd.joblib'))
+
+    # The token index is flattened into one postings array plus offsets
+    tokens = sorted(recommender.token_index)
+    postings = [recommender.token_index[token] for token in tokens]
+    arrays['token_offsets'] = np.cumsum([0] + [len(rows) for rows in postings]).astype(np.int64)
+    arrays['token_postings'] = np.concatenate(postings).astype(np.int32) if postings else np.empty(0, dtype=np.int32)
+
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, f'{name}.npy'), np.ascontiguousarray(array))
+    with open(os.path.join(tmp_dir, 'tokens.json'), 'w') as f:
+        json.dump(tokens, f)
+    joblib.dump(recommender.tfidf_vectorizer, os.path.join(tmp_dir, 'vectorizer.joblib'))
+    recommender.df.to_parquet(os.path.join(tmp_dir, 'catalog.parquet'), index=False)
+
+    manifest = {
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'created_at': time.time(),
+        'num_products': len(recommender.df),
+        'tfidf_shape': list(tfidf.shape),
+        'neighbors_k': int(recommender.neighbor_ids.shape[1]),
+        'similarity_mode': 'tfidf' if recommender.embeddings is None else 'lsa',
+        'catalog_version': recommender.catalog_version,
+    }
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    os.replace(tmp_dir, final_dir)
+    pointer_tmp = os.path.join(root, CURRENT_POINTER + '.tmp')
+    with open(pointer_tmp, 'w') as f:
+        f.write(version)
+    os.replace(pointer_tmp, os.path.join(root, CURRENT_POINTER))
+    print(f"Saved recommender artifacts to {final_dir}.")
+    prune_artifacts(root)
+    return final_dir
+
+
+def prune_artifacts(root=ARTIFACTS_ROOT, keep_previous=KEEP_PREVIOUS_VERSIONS):
+    """
+    Deletes superseded versions, keeping the one CURRENT points at and the
+    keep_previous newest others. Workers still serving a deleted version keep
+    their memory-mapped pages until they restart.
+    """
+    current = current_artifact_dir(root)
+    superseded = []
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        manifest = os.path.join(path, MANIFEST_FILE)
+        if path != current and not name.endswith('.tmp') and os.path.isfile(manifest):
+            superseded.append((os.path.getmtime(manifest), path))
+    for _, path in sorted(superseded, reverse=True)[keep_previous:]:
+        shutil.rmtree(path, ignore_errors=True)
+        print(f"Pruned superseded recommender artifacts {path}.")
+
+
+def artifact_catalog_version(artifact_dir):
+    """The catalog version (see api/db.py) an artifact directory was built from."""
+    with open(os.path.join(artifact_dir, MANIFEST_FILE)) as f:
+        return json.load(f).get('catalog_version', 0)
+
+
+def current_artifact_dir(root=ARTIFACTS_ROOT):
+    """Returns the directory CURRENT points at, or None if no artifacts were built."""
+    try:
+        with open(os.path.join(root, CURRENT_POINTER)) as f:
+            return os.path.join(root, f.read().strip())
+    except FileNotFoundError:
+        return None
+
+
+def load_artifacts(artifact_dir):
+    """
+    Loads a saved artifact directory. The numeric arrays are memory-mapped
+    read-only, so loading is near-instant and the pages are shared between
+    processes through the OS page cache.
+    """
+    with open(os.path.join(artifact_dir, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest['format_version'] != ARTIFACT_FORMAT_VERSION:
+        raise ValueError(
+            f"Artifact format {manifest['format_version']} in {artifact_dir} is not supported "
+            f"(expected {ARTIFACT_FORMAT_VERSION}). Rebuild with build_artifacts.py."
+        )
+
+    def mmap(name):
+        return np.load(os.path.join(artifact_dir, f'{name}.npy'), mmap_mode='r')
+
+    tfidf_matrix = sp.csr_matrix(
+        (mmap('tfidf_data'), mmap('tfidf_indices'), mmap('tfidf_indptr')),
+        shape=tuple(manifest['tfidf_shape']),
+        copy=False,
+    )
+
+    with open(os.path.join(artifact_dir, 'tokens.json')) as f:
+        tokens = json.load(f)
+    offsets, postings = mmap('token_offsets'), mmap('token_postings')
+    token_index = {token: postings[offsets[i]:offsets[i + 1]] for i, token in enumerate(tokens)}
+
+    # LSA artifacts carry the fitted SVD and the embeddings the neighbor index was scored on
+    has_embeddings = manifest.get('similarity_mode', 'tfidf') == 'lsa'
+
+    return {
+        'df': pd.read_parquet(os.path.join(artifact_dir, 'catalog.parquet')),
+        'tfidf_vectorizer': joblib.load(os.path.join(artifact_dir, 'vectorizer.joblib')),
+        'tfidf_matrix': tfidf_matrix,
+        'neighbor_ids': mmap('neighbor_ids'),
+        'neighbor_scores': mmap('neighbor_scores'),
+        'deleted': mmap('deleted'),
+        'token_index': token_index,
+        'svd': joblib.load(os.path.join(artifact_dir, 'svd.joblib')) if has_embeddings else None,
+        'embeddings': mmap('embeddings') if has_embeddings else None,
+        # Older artifacts predate the catalog version and compare as an unchanged catalog
+        'catalog_version': manifest.get('catalog_version', 0),
+    }
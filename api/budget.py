@@ -0,0 +1,138 @@
+import contextvars
+from contextlib import contextmanager
+import os
+import threading
+import time
+
+from .metrics import Counter
+
+# --- Configuration ---
+REQUEST_BUDGET_SECONDS = float(os.getenv("LLM_REQUEST_BUDGET_SECONDS", "4.0")) # Wall-clock LLM budget per request
+LLM_CALL_TIMEOUT_SECONDS = float(os.getenv("LLM_CALL_TIMEOUT_SECONDS", "2.5")) # Upper bound for any single LLM call
+LLM_OFFLINE_CALL_TIMEOUT_SECONDS = float(os.getenv("LLM_OFFLINE_CALL_TIMEOUT_SECONDS", "60")) # Per-call timeout for offline jobs
+LLM_HEDGE_AFTER_SECONDS = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", "0")) # Send a duplicate call after this long; 0 disables hedging
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5")) # Consecutive failures that open the breaker
+CIRCUIT_RESET_SECONDS = float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30")) # How long the breaker stays open before a trial call
+
+# Deadline (time.monotonic()) of the current request and the degradations it has hit so far
+_deadline = contextvars.ContextVar('llm_deadline', default=None)
+_degradations = contextvars.ContextVar('llm_degradations', default=None)
+_offline = contextvars.ContextVar('llm_offline', default=False)
+_degradations_lock = threading.Lock()
+
+DEGRADATIONS = Counter(
+    'llm_degradations_total',
+    'LLM-backed stages that fell back to a non-LLM result.',
+    labelnames=('stage', 'reason')
+)
+
+
+class LLMUnavailable(Exception):
+    """Raised instead of calling the LLM when the budget, a timeout or the circuit breaker rules it out."""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def start_budget(seconds=REQUEST_BUDGET_SECONDS):
+    """
+    Starts the LLM latency budget for the current request and returns the list
+    its degradations are recorded into. Work started from this context (tasks,
+    to_thread, run_llm_call) shares the same deadline and list.
+    """
+    _deadline.set(time.monotonic() + seconds)
+    degradations = []
+    _degradations.set(degradations)
+    return degradations
+
+
+@contextmanager
+def offline_calls():
+    """
+    Marks LLM calls made in this context as offline batch work (e.g.
+    summarize_products.py): they get LLM_OFFLINE_CALL_TIMEOUT_SECONDS and
+    bypass the circuit breaker, which exists to protect request latency.
+    """
+    token = _offline.set(True)
+    try:
+        yield
+    finally:
+        _offline.reset(token)
+
+
+def is_offline():
+    return _offline.get()
+
+
+def remaining():
+    """Seconds left in the current request's budget, or None when no budget is active."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def call_timeout():
+    """Timeout for the next LLM call: the per-call limit, capped by what is left of the budget."""
+    if _offline.get():
+        return LLM_OFFLINE_CALL_TIMEOUT_SECONDS
+    left = remaining()
+    return LLM_CALL_TIMEOUT_SECONDS if left is None else min(LLM_CALL_TIMEOUT_SECONDS, left)
+
+
+def record_degradation(stage, error):
+    """Notes that stage fell back because of error, for the metrics and the current response."""
+    reason = error.reason if isinstance(error, LLMUnavailable) else 'error'
+    DEGRADATIONS.inc(stage=stage, reason=reason)
+    degradations = _degradations.get()
+    if degradations is not None:
+        with _degradations_lock:
+            degradations.append({"stage": stage, "reason": reason})
+
+
+class CircuitBreaker:
+    """
+    Stops sending calls to a failing provider. After failure_threshold
+    consecutive failures the breaker opens and every call is refused for
+    reset_seconds; then a single trial call is let through, and its outcome
+    closes the breaker again or reopens it.
+    """
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_seconds=CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            return 'half_open' if time.monotonic() - self._opened_at >= self.reset_seconds else 'open'
+
+    def allow(self):
+        """Returns True if a call may go out now."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_seconds or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
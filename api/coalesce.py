@@ -0,0 +1,43 @@
+import threading
+
+from .metrics import Counter
+
+COALESCED_CALLS = Counter(
+    'coalesced_calls_total',
+    'Calls that joined an identical in-flight computation instead of running their own.',
+    labelnames=('kind',)
+)
+
+
+class SharedFutures:
+    """
+    Coalesces concurrent calls for the same key onto one Future running on
+    executor: the first caller submits the work, and callers arriving while it
+    runs get the same Future. No caller runs the work itself, so it doesn't
+    inherit any caller's context (latency budget, degradations, stage timings),
+    and every caller waits on it with its own timeout and handles a shared
+    exception on its own. Nothing is cached; once the work finishes the next
+    caller for that key starts a fresh one.
+    """
+
+    def __init__(self, kind, executor):
+        self.kind = kind
+        self._executor = executor
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, func, *args):
+        """Returns the Future computing func(*args) for key, shared with concurrent callers."""
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None:
+                COALESCED_CALLS.inc(kind=self.kind)
+                return future
+            future = self._futures[key] = self._executor.submit(func, *args)
+        future.add_done_callback(lambda done: self._forget(key, done))
+        return future
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._futures.get(key) is future:
+                del self._futures[key]
@@ -0,0 +1,137 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+# --- Configuration ---
+# How strongly each kind of event ties two products together; unknown types count as a view
+EVENT_WEIGHTS = {'view': 1.0, 'add_to_cart': 3.0, 'purchase': 5.0}
+HISTORY_WINDOW = int(os.getenv("CF_HISTORY_WINDOW", "20")) # Each event pairs with this many of the user's previous events
+MAX_NEIGHBORS = int(os.getenv("CF_MAX_NEIGHBORS", "100")) # Co-occurrence entries kept per product
+BUILD_CHUNK_SIZE = 200_000 # Interactions read per chunk while building
+
+
+class CoOccurrenceModel:
+    """
+    Sparse item-item co-occurrence matrix built from user_interactions. Two
+    products co-occur when the same user interacted with both within
+    HISTORY_WINDOW events; the pair is weighted by the product of the event
+    weights. Rows are pruned to their MAX_NEIGHBORS strongest entries, so
+    memory stays bounded by catalog size rather than by the number of events.
+    Row/column positions are the recommender's product row positions.
+    """
+
+    def __init__(self, num_items):
+        self.matrix = sp.csr_matrix((num_items, num_items), dtype=np.float32)
+        self._lock = threading.Lock()
+        self.events_seen = 0
+
+    @classmethod
+    def build(cls, conn, indices, num_items, chunk_size=BUILD_CHUNK_SIZE):
+        """
+        Streams every interaction (ordered by user, then time) from conn and
+        builds the model. Only chunk_size rows plus a HISTORY_WINDOW carry-over
+        are held in memory at once.
+        """
+        model = cls(num_items)
+        query = 'SELECT user_id, product_id, event_type FROM user_interactions ORDER BY user_id, interaction_id'
+        carry = None
+        try:
+            for chunk in pd.read_sql_query(query, conn, chunksize=chunk_size):
+                chunk['position'] = indices.reindex(chunk['product_id']).to_numpy()
+                chunk = chunk.dropna(subset=['position'])
+                # Keep the tail of the previous chunk so pairs that straddle the boundary aren't lost
+                events = chunk if carry is None else pd.concat([carry, chunk], ignore_index=True)
+                is_new = np.arange(len(events)) >= (0 if carry is None else len(carry))
+                model._add_pairs(*model._pairs_from_sequences(events, is_new))
+                model.events_seen += len(chunk)
+                carry = events.tail(HISTORY_WINDOW)
+        except Exception as e:
+            print(f"Could not build the co-occurrence model: {e}")
+        print(f"Built co-occurrence model from {model.events_seen} interactions ({model.matrix.nnz} entries).")
+        return model
+
+    @staticmethod
+    def _pairs_from_sequences(events, is_new):
+        """
+        Vectorized pair generation: events must be grouped by user in time order.
+        Every event flagged in is_new is paired with up to HISTORY_WINDOW earlier
+        events of the same user; earlier events only serve as history.
+        """
+        users = events['user_id'].to_numpy()
+        items = events['position'].to_numpy(dtype=np.int64)
+        weights = events['event_type'].map(EVENT_WEIGHTS).fillna(1.0).to_numpy(dtype=np.float32)
+        rows, cols, vals = [], [], []
+        for lag in range(1, min(HISTORY_WINDOW, len(events) - 1) + 1):
+            later = np.flatnonzero(is_new[lag:]) + lag
+            later = later[(users[later] == users[later - lag]) & (items[later] != items[later - lag])]
+            rows.append(items[later])
+            cols.append(items[later - lag])
+            vals.append(weights[later] * weights[later - lag])
+        if not rows:
+            return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.float32)
+        return np.concatenate(rows), np.concatenate(cols), np.concatenate(vals)
+
+    def _add_pairs(self, rows, cols, vals):
+        if len(rows) == 0:
+            return
+        with self._lock:
+            n = max(self.matrix.shape[0], int(max(rows.max(), cols.max())) + 1)
+            # Co-occurrence is symmetric, so every pair counts in both directions
+            delta = sp.csr_matrix(
+                (np.concatenate([vals, vals]), (np.concatenate([rows, cols]), np.concatenate([cols, rows]))),
+                shape=(n, n), dtype=np.float32
+            )
+            matrix = self.matrix
+            if matrix.shape[0] < n:
+                matrix = sp.csr_matrix((matrix.data, matrix.indices, np.pad(matrix.indptr, (0, n - matrix.shape[0]), mode='edge')), shape=(n, n))
+            self.matrix = self._prune(matrix + delta, np.unique(np.concatenate([rows, cols])))
+
+    @staticmethod
+    def _prune(matrix, touched_rows):
+        """Keeps the MAX_NEIGHBORS largest entries in each touched row."""
+        matrix = matrix.tocsr()
+        row_nnz = np.diff(matrix.indptr)
+        heavy = touched_rows[row_nnz[touched_rows] > MAX_NEIGHBORS]
+        if len(heavy) == 0:
+            return matrix
+        keep = np.ones(matrix.nnz, dtype=bool)
+        for row in heavy:
+            start, end = matrix.indptr[row], matrix.indptr[row + 1]
+            weakest = np.argpartition(matrix.data[start:end], -MAX_NEIGHBORS)[:-MAX_NEIGHBORS]
+            keep[start + weakest] = False
+        matrix.data[~keep] = 0
+        matrix.eliminate_zeros()
+        return matrix
+
+    def add_events(self, events, histories):
+        """
+        Folds newly ingested events into the model. events is a list of
+        (user_id, position, event_type) in arrival order; histories maps each
+        user_id to their earlier (position, event_type) events, oldest first.
+        """
+        new_by_user = {}
+        for user_id, position, event_type in events:
+            new_by_user.setdefault(user_id, []).append((position, event_type))
+
+        sequence, is_new = [], []
+        for user_id, new in new_by_user.items():
+            # Lay each user's history and new events out contiguously, as the pairing expects
+            history = histories.get(user_id, [])[-HISTORY_WINDOW:]
+            sequence.extend((user_id, position, event_type) for position, event_type in history + new)
+            is_new.extend([False] * len(history) + [True] * len(new))
+        if not sequence:
+            return
+        frame = pd.DataFrame(sequence, columns=['user_id', 'position', 'event_type'])
+        self._add_pairs(*self._pairs_from_sequences(frame, np.array(is_new)))
+        self.events_seen += len(events)
+
+    def neighbors(self, position):
+        """Returns (positions, weights) of the products that co-occur with position."""
+        matrix = self.matrix
+        if position >= matrix.shape[0]:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        start, end = matrix.indptr[position], matrix.indptr[position + 1]
+        return matrix.indices[start:end], matrix.data[start:end]
@@ -0,0 +1,233 @@
+import os
+import sqlite3
+import threading
+
+from .metrics import timed
+
+# --- Configuration ---
+DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'db.sqlite3')
+PRODUCTS_TABLE_NAME = 'products'
+INTERACTIONS_TABLE_NAME = 'user_interactions'
+PRECOMPUTED_TABLE_NAME = 'precomputed_recommendations' # Written by precompute_recommendations.py
+CATALOG_VERSION_TABLE_NAME = 'catalog_version' # Single counter bumped by every write to the products table
+MAX_QUERY_PARAMS = 900 # Stay well under SQLite's limit on bound variables per statement
+
+_local = threading.local()
+
+
+def get_db_connection():
+    """
+    Returns this thread's pooled connection to the SQLite database, opening it
+    on first use. sqlite3 connections can't be shared across threads, so each
+    worker thread keeps its own for its lifetime.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, timeout=10)
+        conn.row_factory = sqlite3.Row # This allows us to access columns by name
+        conn.execute('PRAGMA journal_mode=WAL') # Readers don't block the writer and vice versa
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA cache_size=-65536') # 64 MB page cache
+        conn.execute('PRAGMA mmap_size=268435456')
+        _local.conn = conn
+    return conn
+
+
+def init_db():
+    """Creates the indexes the API's lookups rely on. Safe to call on every startup."""
+    conn = get_db_connection()
+    try:
+        with conn:
+            conn.execute(
+                f'CREATE INDEX IF NOT EXISTS idx_{INTERACTIONS_TABLE_NAME}_user '
+                f'ON {INTERACTIONS_TABLE_NAME} (user_id, interaction_id)'
+            )
+            conn.execute(
+                f'CREATE INDEX IF NOT EXISTS idx_{PRODUCTS_TABLE_NAME}_product_id '
+                f'ON {PRODUCTS_TABLE_NAME} (product_id)'
+            )
+            create_catalog_version_table(conn)
+    except sqlite3.Error as e:
+        print(f"Could not create database indexes: {e}")
+
+
+def create_catalog_version_table(conn):
+    conn.execute(
+        f'CREATE TABLE IF NOT EXISTS {CATALOG_VERSION_TABLE_NAME} '
+        f'(id INTEGER PRIMARY KEY CHECK (id = 0), version INTEGER NOT NULL)'
+    )
+
+
+def read_catalog_version(conn):
+    """
+    Returns the catalog version stored on conn's database: 0 for a catalog
+    that was never changed since seeding, or when the table doesn't exist yet.
+    """
+    try:
+        row = conn.execute(f'SELECT version FROM {CATALOG_VERSION_TABLE_NAME} WHERE id = 0').fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] if row else 0
+
+
+def bump_catalog_version(conn):
+    """Increments the catalog version; call it in the same transaction as the products write."""
+    create_catalog_version_table(conn)
+    conn.execute(
+        f'INSERT INTO {CATALOG_VERSION_TABLE_NAME} (id, version) VALUES (0, 1) '
+        f'ON CONFLICT (id) DO UPDATE SET version = version + 1'
+    )
+
+
+def get_catalog_version():
+    """The current catalog version, compared against the one artifacts were built from."""
+    return read_catalog_version(get_db_connection())
+
+
+def _chunks(values, size=MAX_QUERY_PARAMS):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+@timed('db_lookup')
+def get_product_details(product_id: str):
+    """Fetches product details from the database by product_id."""
+    product = get_db_connection().execute(
+        f'SELECT * FROM {PRODUCTS_TABLE_NAME} WHERE product_id = ?', (product_id,)
+    ).fetchone()
+    if product is None:
+        return None
+    return dict(product) # Convert the Row object to a dictionary
+
+
+@timed('db_lookup')
+def get_products(product_ids):
+    """Fetches details for many products with one IN (...) query per chunk, keyed by product_id."""
+    product_ids = list(dict.fromkeys(product_ids))
+    conn = get_db_connection()
+    products = {}
+    for chunk in _chunks(product_ids):
+        placeholders = ','.join('?' * len(chunk))
+        rows = conn.execute(f'SELECT * FROM {PRODUCTS_TABLE_NAME} WHERE product_id IN ({placeholders})', chunk)
+        products.update((row['product_id'], dict(row)) for row in rows)
+    return products
+
+
+@timed('db_lookup')
+def get_precomputed_recommendations(product_id: str):
+    """Returns the precomputed recommendation ids for a product, or None if it has no usable row."""
+    try:
+        row = get_db_connection().execute(
+            f'SELECT recommended_ids FROM {PRECOMPUTED_TABLE_NAME} WHERE product_id = ?', (product_id,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None # The precompute job hasn't been run against this database
+    if row is None or not row['recommended_ids']:
+        return None # An empty list says nothing the live engine couldn't, so it is computed live
+    return row['recommended_ids'].split(',')
+
+
+def delete_precomputed_recommendations(product_ids):
+    """Drops precomputed rows for products whose catalog entry changed, so they are computed live."""
+    conn = get_db_connection()
+    try:
+        with conn:
+            conn.executemany(
+                f'DELETE FROM {PRECOMPUTED_TABLE_NAME} WHERE product_id = ?', [(pid,) for pid in product_ids]
+            )
+    except sqlite3.OperationalError:
+        pass
+
+
+@timed('db_lookup')
+def get_last_user_interaction(user_id: str):
+    """Fetches the last product a user interacted with and that interaction's id, as (product_id, interaction_id)."""
+    # For simplicity, we just grab the latest interaction.
+    interaction = get_db_connection().execute(
+        f'SELECT product_id, interaction_id FROM {INTERACTIONS_TABLE_NAME} WHERE user_id = ? ORDER BY interaction_id DESC LIMIT 1',
+        (user_id,)
+    ).fetchone()
+    if interaction is None:
+        return None
+    return interaction['product_id'], interaction['interaction_id']
+
+
+@timed('db_lookup')
+def get_last_user_interactions(user_ids):
+    """Fetches the last product each user interacted with, keyed by user_id."""
+    user_ids = list(dict.fromkeys(user_ids))
+    conn = get_db_connection()
+    interactions = {}
+    for chunk in _chunks(user_ids):
+        placeholders = ','.join('?' * len(chunk))
+        rows = conn.execute(
+            f'''SELECT user_id, product_id FROM {INTERACTIONS_TABLE_NAME} WHERE interaction_id IN (
+                SELECT MAX(interaction_id) FROM {INTERACTIONS_TABLE_NAME} WHERE user_id IN ({placeholders}) GROUP BY user_id
+            )''',
+            chunk
+        )
+        interactions.update((row['user_id'], row['product_id']) for row in rows)
+    return interactions
+
+
+@timed('db_lookup')
+def get_recent_interactions(user_ids, limit):
+    """Fetches each user's last `limit` (product_id, event_type) events, oldest first, keyed by user_id."""
+    user_ids = list(dict.fromkeys(user_ids))
+    conn = get_db_connection()
+    histories = {}
+    for chunk in _chunks(user_ids):
+        placeholders = ','.join('?' * len(chunk))
+        rows = conn.execute(
+            f'''SELECT user_id, product_id, event_type FROM (
+                SELECT user_id, product_id, event_type, interaction_id,
+                       ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY interaction_id DESC) AS recency
+                FROM {INTERACTIONS_TABLE_NAME} WHERE user_id IN ({placeholders})
+            ) WHERE recency <= ? ORDER BY user_id, interaction_id''',
+            chunk + [limit]
+        )
+        for row in rows:
+            histories.setdefault(row['user_id'], []).append((row['product_id'], row['event_type']))
+    return histories
+
+
+def insert_interactions(interactions):
+    """
+    Appends a list of (user_id, product_id, event_type) rows to user_interactions
+    in one transaction and returns their interaction_ids, in the same order.
+    """
+    conn = get_db_connection()
+    with conn:
+        conn.executemany(
+            f'INSERT INTO {INTERACTIONS_TABLE_NAME} (user_id, product_id, event_type) VALUES (?, ?, ?)',
+            interactions
+        )
+        # The transaction holds the write lock, so its rows got consecutive ids
+        last_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+    return list(range(last_id - len(interactions) + 1, last_id + 1))
+
+
+def save_products(products):
+    """Replaces the given products (dicts) in the database, clearing any stale precomputed summary."""
+    conn = get_db_connection()
+    with conn:
+        conn.executemany(
+            f'DELETE FROM {PRODUCTS_TABLE_NAME} WHERE product_id = ?',
+            [(p['product_id'],) for p in products]
+        )
+        conn.executemany(
+            f'INSERT INTO {PRODUCTS_TABLE_NAME} (product_id, name, category, description) VALUES (?, ?, ?, ?)',
+            [(p['product_id'], p['name'], p['category'], p['description']) for p in products]
+        )
+        bump_catalog_version(conn)
+
+
+def remove_product(product_id: str):
+    """Deletes a product; returns the number of rows removed."""
+    conn = get_db_connection()
+    with conn:
+        removed = conn.execute(f'DELETE FROM {PRODUCTS_TABLE_NAME} WHERE product_id = ?', (product_id,)).rowcount
+        if removed:
+            bump_catalog_version(conn)
+        return removed
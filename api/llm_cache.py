@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .metrics import register_gauge_collector
+
+# --- Configuration ---
+CACHE_DB_PATH = os.getenv(
+    "LLM_CACHE_DB_PATH",
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'llm_cache.sqlite3')
+)
+MEMORY_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_MAX_ENTRIES", "2048"))
+DISK_MAX_ENTRIES = int(os.getenv("LLM_CACHE_DISK_MAX_ENTRIES", "200000"))
+TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+CACHE_TABLE_NAME = 'llm_cache'
+
+
+def make_key(model: str, prompt: str, **params) -> str:
+    """Builds a stable cache key from the model, a hash of the prompt and the call parameters."""
+    prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+    payload = json.dumps({"model": model, "prompt": prompt_hash, "params": params}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """
+    Two-tier cache for LLM completions: an in-process LRU in front of an
+    on-disk SQLite table with TTL and size-based eviction.
+    """
+
+    def __init__(self, db_path=CACHE_DB_PATH, memory_max_entries=MEMORY_MAX_ENTRIES,
+                 disk_max_entries=DISK_MAX_ENTRIES, ttl_seconds=TTL_SECONDS):
+        self.db_path = db_path
+        self.memory_max_entries = memory_max_entries
+        self.disk_max_entries = disk_max_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes_since_evict = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._disk_enabled = self._init_disk()
+
+    def _init_disk(self):
+        try:
+            conn = self._connection()
+            conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {CACHE_TABLE_NAME} (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            ''')
+            conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{CACHE_TABLE_NAME}_accessed ON {CACHE_TABLE_NAME} (accessed_at)')
+            conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"LLM disk cache disabled, could not open {self.db_path}: {e}")
+            return False
+
+    def _connection(self):
+        # sqlite3 connections can't be shared across threads, so keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key, value, created_at):
+        # Entries carry their creation time so the memory tier expires them like the disk tier does
+        with self._lock:
+            self._memory[key] = (value, created_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_max_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Returns the cached value for key, or None on a miss."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if time.time() - created_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+        if self._disk_enabled:
+            try:
+                conn = self._connection()
+                now = time.time()
+                row = conn.execute(
+                    f'SELECT value, created_at FROM {CACHE_TABLE_NAME} WHERE key = ?', (key,)
+                ).fetchone()
+                if row is not None and now - row[1] <= self.ttl_seconds:
+                    conn.execute(f'UPDATE {CACHE_TABLE_NAME} SET accessed_at = ? WHERE key = ?', (now, key))
+                    conn.commit()
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    with self._lock:
+                        self.stats["disk_hits"] += 1
+                    return value
+            except sqlite3.Error as e:
+                print(f"LLM disk cache read failed: {e}")
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def set(self, key, value):
+        """Stores value (any JSON-serializable object) under key in both tiers."""
+        now = time.time()
+        self._remember(key, value, now)
+        if not self._disk_enabled:
+            return
+        try:
+            conn = self._connection()
+            conn.execute(
+                f'INSERT OR REPLACE INTO {CACHE_TABLE_NAME} (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(value), now, now)
+            )
+            conn.commit()
+            with self._lock:
+                self._writes_since_evict += 1
+                should_evict = self._writes_since_evict >= 100
+                if should_evict:
+                    self._writes_since_evict = 0
+            if should_evict:
+                self.evict()
+        except sqlite3.Error as e:
+            print(f"LLM disk cache write failed: {e}")
+
+    def evict(self):
+        """Drops expired rows, then the least recently used rows above the size limit."""
+        conn = self._connection()
+        expired = conn.execute(
+            f'DELETE FROM {CACHE_TABLE_NAME} WHERE created_at < ?', (time.time() - self.ttl_seconds,)
+        ).rowcount
+        overflow = conn.execute(f'''
+            DELETE FROM {CACHE_TABLE_NAME} WHERE key IN (
+                SELECT key FROM {CACHE_TABLE_NAME} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+        ''', (self.disk_max_entries,)).rowcount
+        conn.commit()
+        with self._lock:
+            self.stats["evictions"] += expired + overflow
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+# Shared cache used by every LLM call in the API process
+cache = LLMCache()
+
+
+@register_gauge_collector
+def _cache_metrics():
+    stats = cache.get_stats()
+    return [
+        ('llm_cache_memory_hits', 'LLM cache hits served from the in-process LRU.', stats['memory_hits']),
+        ('llm_cache_disk_hits', 'LLM cache hits served from the SQLite tier.', stats['disk_hits']),
+        ('llm_cache_misses', 'LLM cache lookups that went to the provider.', stats['misses']),
+        ('llm_cache_evictions', 'Rows evicted from the SQLite tier.', stats['evictions']),
+        ('llm_cache_memory_entries', 'Entries currently held in the in-process LRU.', stats['memory_entries']),
+        ('llm_cache_hit_rate', 'Share of LLM cache lookups that were hits.', stats['hit_rate']),
+    ]
@@ -1,9 +1,26 @@
+import json
 import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
 import dotenv
 dotenv.load_dotenv() 
 from groq import Groq
+from .budget import (
+    LLM_CALL_TIMEOUT_SECONDS, LLM_HEDGE_AFTER_SECONDS, LLM_OFFLINE_CALL_TIMEOUT_SECONDS, CircuitBreaker,
+    LLMUnavailable, call_timeout, is_offline, record_degradation,
+)
+from .coalesce import SharedFutures
+from .llm_cache import cache, make_key
+from .metrics import LLM_CALLS, LLM_ERRORS, LLM_TOKENS, Counter, register_gauge_collector, timed
 
 API_KEY = os.getenv("GROQ_API_KEY")
+LLM_MODEL = "llama-3.1-8b-instant" # This is the correct model name for Llama 3 8B on Groq
+PROVIDER_THREADS = 32 # Threads that wait on the provider, so a call can be abandoned at its timeout
+BATCH_SUMMARY_MAX_WORDS = 40 # Batched summaries longer than this are rejected (the prompt asks for 25)
+BATCH_EXPLANATION_MAX_CHARS = 300
+
+LLM_HEDGES = Counter('llm_hedged_calls_total', 'Duplicate LLM calls sent because the first was slow.', labelnames=('model',))
 
 # --- Initialization ---
 client = None
@@ -16,7 +33,110 @@ else:
     except Exception as e:
         print(f"!!! CRITICAL: Failed to configure Groq client. Error: {e}")
 
+# Shared by every LLM call in the process: stops calling the provider after repeated failures
+breaker = CircuitBreaker()
+_provider_pool = ThreadPoolExecutor(max_workers=PROVIDER_THREADS, thread_name_prefix="llm-provider")
+# Identical prompts requested concurrently (e.g. a trending product) share one provider call, run on its own pool
+_in_flight = SharedFutures('llm', ThreadPoolExecutor(max_workers=PROVIDER_THREADS, thread_name_prefix="llm-shared"))
+
+
+@register_gauge_collector
+def _breaker_metrics():
+    return [('llm_circuit_open', 'Whether the LLM circuit breaker is currently refusing calls.', int(breaker.state == 'open'))]
+
+
+def _request_completion(prompt, model, timeout, params):
+    return client.chat.completions.create(
+        messages=[{"role": "user", "content": prompt}],
+        model=model,
+        timeout=timeout,
+        **params,
+    )
+
+
+def _complete(prompt, model, params, offline):
+    """
+    Sends the prompt to the provider, giving up after the full per-call timeout.
+    The call is shared by every caller of the prompt, so no single request's
+    budget shortens it (callers stop waiting on their own), and a timeout here
+    always says something about the provider. With hedging enabled, a
+    duplicate request goes out if the first hasn't answered after
+    LLM_HEDGE_AFTER_SECONDS and the first successful answer wins. Offline calls
+    (see budget.offline_calls) don't consult or feed the circuit breaker.
+    """
+    if not offline and not breaker.allow():
+        raise LLMUnavailable('circuit_open')
+
+    timeout = LLM_OFFLINE_CALL_TIMEOUT_SECONDS if offline else LLM_CALL_TIMEOUT_SECONDS
+    LLM_CALLS.inc(model=model)
+    deadline = time.monotonic() + timeout
+    pending = {_provider_pool.submit(_request_completion, prompt, model, timeout, params)}
+    try:
+        if 0 < LLM_HEDGE_AFTER_SECONDS < timeout:
+            done, _ = wait(pending, timeout=LLM_HEDGE_AFTER_SECONDS)
+            if not done:
+                LLM_HEDGES.inc(model=model)
+                LLM_CALLS.inc(model=model)
+                pending.add(_provider_pool.submit(_request_completion, prompt, model, deadline - time.monotonic(), params))
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                raise LLMUnavailable('timeout')
+            for attempt in done:
+                if attempt.exception() is None:
+                    if not offline:
+                        breaker.record_success()
+                    return attempt.result()
+                error = attempt.exception()
+        raise error
+    except Exception:
+        LLM_ERRORS.inc(model=model)
+        if not offline:
+            breaker.record_failure()
+        raise
 
+
+def cached_completion(prompt: str, model: str = LLM_MODEL, validate=None, **params) -> str:
+    """
+    Returns the completion text for a single-message prompt, serving repeats from
+    the LLM cache and joining an identical call already in flight. Each caller
+    waits only as long as its own budget allows. Errors (including
+    LLMUnavailable when the latency budget, call timeout or circuit breaker
+    rule the call out) are raised to every caller, so each one records its own
+    degradation and keeps its own fallback. If validate is given, completions
+    it rejects are still returned but not cached, so a bad answer isn't replayed.
+    """
+    key = make_key(model, prompt, **params)
+    content = cache.get(key)
+    if content is not None:
+        return content
+
+    timeout = call_timeout()
+    if timeout <= 0:
+        raise LLMUnavailable('budget_exhausted')
+    offline = is_offline()
+    future = _in_flight.submit((key, offline), _fetch_completion, key, prompt, model, params, validate, offline)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeout:
+        # Only this caller gives up: the shared call runs on and its answer is cached for later requests
+        raise LLMUnavailable('timeout')
+
+
+def _fetch_completion(key, prompt, model, params, validate, offline):
+    chat_completion = _complete(prompt, model, params, offline)
+    usage = getattr(chat_completion, 'usage', None)
+    if usage is not None:
+        LLM_TOKENS.inc(usage.prompt_tokens or 0, model=model, type='prompt')
+        LLM_TOKENS.inc(usage.completion_tokens or 0, model=model, type='completion')
+    content = chat_completion.choices[0].message.content.strip()
+    if validate is None or validate(content):
+        cache.set(key, content)
+    return content
+
+
+@timed('explanation')
 def generate_explanation(source_product: dict, recommended_product: dict) -> str:
     if not client:
         return "Groq LLM was not initialized. Check server startup logs."
@@ -28,30 +148,19 @@ def generate_explanation(source_product: dict, recommended_product: dict) -> str
     Explain why this is a good recommendation in one short, friendly sentence. Start with "Because you viewed...".
     """
     try:
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt,
-                }
-            ],
-            # This is the correct model name for Llama 3 8B on Groq
-            model="llama-3.1-8b-instant",
-        )
-        return chat_completion.choices[0].message.content.strip()
+        return cached_completion(prompt)
     except Exception as e:
         print(f"Error during Groq LLM call: {e}")
+        record_degradation('explanation', e)
         return "We think you'll like this product based on your recent activity."
     
-    # Add this new function to the bottom of your llm_handler.py file
 
-def summarize_description_with_llm(product_name: str, description: str) -> str:
+@timed('summarization')
+def generate_summary(product_name: str, description: str) -> str:
     """
-    Uses the LLM to create a short, punchy summary of a product description.
+    Asks the LLM for a short, punchy summary of a product description.
+    Raises on failure; callers decide on the fallback.
     """
-    if not client:
-        return description[:150] # Fallback to a simple truncation
-
     prompt = f"""
     You are an expert e-commerce copywriter. Your task is to summarize a long, messy product description into a concise and appealing blurb for a customer.
 
@@ -65,13 +174,100 @@ def summarize_description_with_llm(product_name: str, description: str) -> str:
 
     **Summary:**
     """
+    # A bit of creativity is good for marketing copy
+    return cached_completion(prompt, temperature=0.5)
+
+def summarize_description_with_llm(product_name: str, description: str) -> str:
+    """
+    Uses the LLM to create a short, punchy summary of a product description.
+    """
+    if not client:
+        return description[:150] # Fallback to a simple truncation
+
     try:
-        chat_completion = client.chat.completions.create(
-            messages=[{"role": "user", "content": prompt}],
-            model="llama-3.1-8b-instant",
-            temperature=0.5, # A bit of creativity is good for marketing copy
-        )
-        return chat_completion.choices[0].message.content.strip()
+        return generate_summary(product_name, description)
     except Exception as e:
         print(f"Error during description summarization: {e}")
-        return description[:150] # Fallback on error
\ No newline at end of file
+        record_degradation('summarization', e)
+        return description[:150] # Fallback on error
+
+
+@timed('batch_description')
+def generate_descriptions(source_product: dict, recommended_products: list) -> list:
+    """
+    Summarizes and explains every recommended product with a single structured
+    completion instead of one call per product and task. Products that already
+    carry a precomputed 'summary' are only explained. Returns one
+    {"summary", "explanation"} dict per product, in order; a field is None when
+    the LLM failed or its answer for that item didn't validate, so callers can
+    fall back per item.
+    """
+    results = [{"summary": None, "explanation": None} for _ in recommended_products]
+    if not client or not recommended_products:
+        return results
+
+    needs_summary = [not product.get('summary') for product in recommended_products]
+    items = []
+    for i, (product, summarize) in enumerate(zip(recommended_products, needs_summary), start=1):
+        items.append(f'Item {i}: "{product["name"]}"')
+        if summarize:
+            items.append(f'Item {i} long description: "{product["description"]}"')
+    item_lines = '\n    '.join(items)
+    prompt = f"""
+    You are an expert e-commerce assistant and copywriter.
+    A user recently viewed '{source_product['name']}'. We are recommending the items below.
+
+    {item_lines}
+
+    For every item, write an "explanation": why it is a good recommendation, in one short, friendly sentence starting with "Because you viewed...".
+    For every item that has a long description, also write a "summary": a single, engaging sentence of at most 25 words that includes the primary material and the product type.
+
+    Return only a JSON object of the form {{"items": [{{"id": 1, "explanation": "...", "summary": "..."}}, ...]}} with one entry per item, omitting "summary" for items without a long description.
+    """
+
+    def parse(content):
+        try:
+            entries = json.loads(content)['items']
+        except (ValueError, KeyError, TypeError):
+            return None
+        if not isinstance(entries, list):
+            return None
+        parsed = {}
+        for entry in entries:
+            if not isinstance(entry, dict) or not isinstance(entry.get('id'), int):
+                continue
+            index = entry['id'] - 1
+            if not 0 <= index < len(recommended_products):
+                continue
+            explanation, summary = entry.get('explanation'), entry.get('summary')
+            parsed[index] = {
+                "explanation": explanation.strip() if isinstance(explanation, str) and explanation.strip()
+                and len(explanation) <= BATCH_EXPLANATION_MAX_CHARS else None,
+                "summary": summary.strip() if needs_summary[index] and isinstance(summary, str) and summary.strip()
+                and len(summary.split()) <= BATCH_SUMMARY_MAX_WORDS else None,
+            }
+        return parsed
+
+    def is_complete(content):
+        parsed = parse(content)
+        return parsed is not None and all(
+            index in parsed and parsed[index]["explanation"] and (parsed[index]["summary"] or not needs_summary[index])
+            for index in range(len(recommended_products))
+        )
+
+    try:
+        content = cached_completion(
+            prompt, validate=is_complete, temperature=0.3, response_format={"type": "json_object"}
+        )
+    except Exception as e:
+        print(f"Error during batched description call: {e}")
+        record_degradation('batch_description', e)
+        return results
+
+    parsed = parse(content)
+    if parsed is None:
+        print("Batched description response was not valid JSON; falling back to per-item calls.")
+        return results
+    for index, entry in parsed.items():
+        results[index] = entry
+    return results
@@ -1,13 +1,48 @@
-from fastapi import FastAPI, HTTPException
-import sqlite3
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from typing import List
+import asyncio
+import contextvars
+import functools
+import json
 import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Import our custom modules
-from .recommender import Recommender
-from .llm_handler import generate_explanation, summarize_description_with_llm
+from .recommender import Recommender, CF_BLEND_WEIGHT
+from .artifacts import current_artifact_dir
+from .llm_handler import generate_descriptions, generate_explanation, summarize_description_with_llm
+from .budget import start_budget
+from .metrics import REQUEST_SECONDS, format_server_timing, render_metrics, start_request_timings
+from .db import (
+    init_db, get_product_details, get_products, get_last_user_interaction,
+    get_last_user_interactions, save_products, remove_product,
+    get_precomputed_recommendations, delete_precomputed_recommendations,
+    get_recent_interactions, insert_interactions, get_catalog_version,
+)
+from .collaborative import HISTORY_WINDOW
+from .profiles import PROFILE_HISTORY
 
 # --- Configuration ---
-DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'db.sqlite3')
+# Serve prebuilt artifacts when available (see build_artifacts.py); otherwise build from the database
+ARTIFACT_DIR = os.getenv("RECOMMENDER_ARTIFACT_DIR") or current_artifact_dir()
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8")) # Max LLM calls in flight per worker
+NUM_RECS = 5
+# "precomputed" serves lists written by precompute_recommendations.py and computes live only on a miss;
+# "profile" ranks against each user's recent history instead of only their last product
+RECOMMENDATION_MODE = os.getenv("RECOMMENDATION_MODE", "live")
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "1000")) # Queued interactions that trigger an early flush
+INGEST_FLUSH_SECONDS = float(os.getenv("INGEST_FLUSH_SECONDS", "1.0")) # Max time an interaction waits in the queue
+INGEST_MAX_QUEUE = int(os.getenv("INGEST_MAX_QUEUE", "100000")) # Queued interactions above which POST /interactions returns 503
+INGEST_MAX_RETRIES = int(os.getenv("INGEST_MAX_RETRIES", "5")) # Flushes a batch is retried for while the database is locked
+TIMING_HEADER = "X-Timing-Breakdown" # Send "1" to get a per-stage Server-Timing header back
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+BATCH_CHUNK_SIZE = 500 # Users resolved and streamed per step of the batch endpoint
+# Summarize and explain all recommendations of a request with one LLM call instead of one per product and task
+LLM_BATCH_PROMPTS = os.getenv("LLM_BATCH_PROMPTS", "1") == "1"
 
 # --- FastAPI App Initialization ---
 app = FastAPI(
@@ -20,6 +55,52 @@ app = FastAPI(
 # This is a global variable that will hold our recommender engine.
 # It's loaded once when the application starts up.
 recommender_engine = None
+# Interactions accepted by POST /interactions and not yet written, flushed in micro-batches
+interaction_queue = []
+interaction_flush_needed = None
+interaction_flusher = None
+# (batch, attempts) of a write that hit a locked database, retried ahead of the queue
+interaction_retry = None
+# The Groq client is blocking, so LLM calls run on a dedicated, bounded thread pool
+llm_executor = ThreadPoolExecutor(max_workers=LLM_CONCURRENCY, thread_name_prefix="llm")
+
+async def _observe_when_done(body_iterator, start, **labels):
+    try:
+        async for chunk in body_iterator:
+            yield chunk
+    finally:
+        REQUEST_SECONDS.observe(time.perf_counter() - start, **labels)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """
+    Records request latency and, when the client opts in via TIMING_HEADER,
+    returns the per-stage breakdown as a Server-Timing header. Stages that run
+    concurrently (e.g. several summaries) are summed. Streamed (NDJSON)
+    responses are recorded once their body finishes; their headers go out
+    before any stage runs, so they never carry Server-Timing.
+    """
+    timings = start_request_timings() if request.headers.get(TIMING_HEADER) == "1" else None
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    labels = dict(method=request.method, route=route.path if route else "unmatched", status=response.status_code)
+    if response.headers.get("content-type", "").startswith(NDJSON_MEDIA_TYPE):
+        response.body_iterator = _observe_when_done(response.body_iterator, start, **labels)
+        return response
+    elapsed = time.perf_counter() - start
+    REQUEST_SECONDS.observe(elapsed, **labels)
+    if timings is not None:
+        timings["total"] = elapsed
+        response.headers["Server-Timing"] = format_server_timing(timings)
+    return response
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Exposes latency histograms, LLM usage and cache stats in Prometheus format.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 @app.on_event("startup")
 def load_recommender():
@@ -28,90 +109,425 @@ def load_recommender():
     """
     global recommender_engine
     print("API starting up. Loading recommender model...")
-    recommender_engine = Recommender()
+    init_db()
+    recommender_engine = Recommender(artifact_dir=ARTIFACT_DIR)
+    if CF_BLEND_WEIGHT > 0:
+        recommender_engine.enable_collaborative()
+    if ARTIFACT_DIR and recommender_engine.catalog_version != get_catalog_version():
+        # Upserts and deletes since the artifacts were built only lived in memory; refit and save a new version
+        print("The catalog changed since these artifacts were built, scheduling a refit.")
+        recommender_engine.schedule_refit()
     print("Recommender model loaded.")
 
+@app.on_event("startup")
+async def start_interaction_flusher():
+    global interaction_flush_needed, interaction_flusher
+    interaction_flush_needed = asyncio.Event()
+    interaction_flusher = asyncio.create_task(flush_interactions_periodically())
+
+@app.on_event("shutdown")
+async def flush_pending_interactions():
+    if interaction_flusher is not None:
+        interaction_flusher.cancel()
+        try:
+            await interaction_flusher
+        except asyncio.CancelledError:
+            pass
+    await flush_interactions()
+
 # --- Helper Functions ---
-def get_db_connection():
-    """Establishes a connection to the SQLite database."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row # This allows us to access columns by name
-    return conn
-
-def get_product_details(product_id: str):
-    """Fetches product details from the database by product_id."""
-    conn = get_db_connection()
-    product = conn.execute('SELECT * FROM products WHERE product_id = ?', (product_id,)).fetchone()
-    conn.close()
-    if product is None:
-        return None
-    return dict(product) # Convert the Row object to a dictionary
-
-def get_last_user_interaction(user_id: str):
-    """Fetches the last product a user interacted with."""
-    conn = get_db_connection()
-    # For simplicity, we just grab the latest interaction.
-    interaction = conn.execute(
-        'SELECT product_id FROM user_interactions WHERE user_id = ? ORDER BY interaction_id DESC LIMIT 1',
-        (user_id,)
-    ).fetchone()
-    conn.close()
-    if interaction is None:
-        return None
-    return interaction['product_id']
+async def run_llm_call(func, *args, **kwargs):
+    """
+    Runs a blocking LLM helper on the LLM thread pool without blocking the event
+    loop. It runs in this request's context, so its budget, degradations and
+    stage timings are the request's own; identical prompts from concurrent
+    requests share one provider call underneath (see cached_completion).
+    """
+    loop = asyncio.get_running_loop()
+    # run_in_executor doesn't carry context variables over like asyncio.to_thread does
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(llm_executor, functools.partial(context.run, func, *args, **kwargs))
+
+def recommend(product_id: str, use_llm: bool = True):
+    """
+    Returns recommendation ids for a product from the precomputed table or the
+    live engine. use_llm=False ranks a live computation on content alone.
+    """
+    if RECOMMENDATION_MODE == "precomputed":
+        recommended_ids = get_precomputed_recommendations(product_id)
+        if recommended_ids is not None:
+            return recommended_ids[:NUM_RECS]
+    return recommender_engine.get_recommendations(product_id=product_id, num_recs=NUM_RECS, use_llm=use_llm)
+
+def recommend_for_user(user_id: str, product_id: str, last_interaction_id: int):
+    """Profile mode: ranks against the user's recent history, falling back to their last product."""
+    def load_history(uid):
+        return get_recent_interactions([uid], PROFILE_HISTORY).get(uid, [])
+
+    recommended_ids = recommender_engine.recommend_for_user(
+        user_id, load_history, num_recs=NUM_RECS, last_interaction_id=last_interaction_id
+    )
+    return recommended_ids or recommend(product_id)
+
+async def recommend_async(product_id: str, user_id: str = None, use_llm: bool = True, last_interaction_id: int = 0):
+    """
+    recommend() off the event loop, in the caller's context. In profile mode,
+    requests that name a user are ranked for that user; last_interaction_id is
+    that user's newest interaction_id, used to spot a stale cached profile.
+    """
+    if RECOMMENDATION_MODE == "profile" and user_id is not None:
+        return await asyncio.to_thread(recommend_for_user, user_id, product_id, last_interaction_id)
+    return await asyncio.to_thread(recommend, product_id, use_llm)
+
+async def summarize_product(product: dict) -> str:
+    """
+    Returns the summary precomputed by summarize_products.py, falling back to
+    live generation for rows that don't have one yet.
+    """
+    summary = product.pop('summary', None)
+    if summary:
+        return summary
+    return await run_llm_call(summarize_description_with_llm, product['name'], product['description'])
+
+async def describe_recommendation(source_product: dict, rec_details: dict):
+    """Summarizes a recommended product and explains it, running both LLM calls concurrently."""
+    summary, explanation = await asyncio.gather(
+        summarize_product(rec_details),
+        run_llm_call(generate_explanation, source_product=source_product, recommended_product=rec_details),
+    )
+    rec_details['description'] = summary
+    return {
+        "recommended_product": rec_details,
+        "explanation": explanation
+    }
+
+async def describe_recommendations(source_product: dict, recs: list):
+    """
+    Describes every recommended product. With LLM_BATCH_PROMPTS one structured
+    completion covers all of them, and only items it didn't return valid text
+    for go through the per-item calls.
+    """
+    if not LLM_BATCH_PROMPTS:
+        return await asyncio.gather(*[describe_recommendation(source_product, rec) for rec in recs])
+
+    batched = await run_llm_call(generate_descriptions, source_product=source_product, recommended_products=recs)
+
+    async def finish(rec, generated):
+        # Items run concurrently; within one, the rare fallbacks are awaited in turn
+        summary = generated["summary"] or await summarize_product(rec)
+        explanation = generated["explanation"] or await run_llm_call(
+            generate_explanation, source_product=source_product, recommended_product=rec
+        )
+        rec.pop('summary', None)
+        rec['description'] = summary
+        return {
+            "recommended_product": rec,
+            "explanation": explanation
+        }
+
+    return await asyncio.gather(*[finish(rec, generated) for rec, generated in zip(recs, batched)])
 
 # --- API Endpoint ---
 @app.get("/recommendations/{user_id}")
-def get_recommendations_for_user(user_id: str):
+async def get_recommendations_for_user(user_id: str):
     """
     Generates product recommendations for a given user ID.
     """
     print(f"Received request for user_id: {user_id}")
+    # LLM calls made for this request share one latency budget; anything cut short is listed in the response
+    degradations = start_budget()
 
     # 1. Find the source product from the user's behavior
-    last_viewed_product_id = get_last_user_interaction(user_id)
-    if not last_viewed_product_id:
+    last_interaction = await asyncio.to_thread(get_last_user_interaction, user_id)
+    if not last_interaction:
         raise HTTPException(status_code=404, detail=f"User with ID '{user_id}' not found or has no interactions.")
+    last_viewed_product_id, last_interaction_id = last_interaction
 
-    source_product_details = get_product_details(last_viewed_product_id)
+    source_product_details = await asyncio.to_thread(get_product_details, last_viewed_product_id)
     if not source_product_details:
          raise HTTPException(status_code=404, detail=f"Source product with ID '{last_viewed_product_id}' not found.")
 
     print(f"User's last interaction was with product: {source_product_details['name']}")
 
-    # --- NEW: Summarize the source product's description ---
-    source_product_details['description'] = summarize_description_with_llm(
-        source_product_details['name'],
-        source_product_details['description']
+    # 2. Summarize the source product while the recommender engine runs
+    source_summary, recommended_ids = await asyncio.gather(
+        summarize_product(source_product_details),
+        recommend_async(last_viewed_product_id, user_id, last_interaction_id=last_interaction_id),
     )
-
-    # 2. Get recommendations from the recommender engine
-    recommended_ids = recommender_engine.get_recommendations(product_id=last_viewed_product_id, num_recs=5)
+    source_product_details['description'] = source_summary
     if not recommended_ids:
         raise HTTPException(status_code=404, detail="Could not generate recommendations for this product.")
 
-    # 3. For each recommendation, fetch details, summarize, and generate an explanation
-    recommendations_with_explanations = []
-    for rec_id in recommended_ids:
-        rec_details = get_product_details(rec_id)
-        if rec_details:
-            # --- NEW: Summarize the recommended product's description ---
-            rec_details['description'] = summarize_description_with_llm(
-                rec_details['name'],
-                rec_details['description']
-            )
-
-            explanation = generate_explanation(
-                source_product=source_product_details,
-                recommended_product=rec_details
-            )
-            recommendations_with_explanations.append({
-                "recommended_product": rec_details,
-                "explanation": explanation
-            })
+    # 3. Fetch details, then summarize and explain every recommendation concurrently (order is preserved)
+    rec_details_by_id = await asyncio.to_thread(get_products, recommended_ids)
+    recommendations_with_explanations = await describe_recommendations(
+        source_product_details, [rec_details_by_id[rec_id] for rec_id in recommended_ids if rec_id in rec_details_by_id]
+    )
 
     return {
         "user_id": user_id,
         "source_product": source_product_details,
-        "recommendations": recommendations_with_explanations
-    }
\ No newline at end of file
+        "recommendations": list(recommendations_with_explanations),
+        "degradations": degradations
+    }
+
+def _ndjson(event: dict) -> str:
+    return json.dumps(event) + "\n"
+
+async def _labeled(kind: str, index: int, awaitable):
+    return kind, index, await awaitable
+
+@app.get("/recommendations/{user_id}/stream")
+async def stream_recommendations_for_user(user_id: str):
+    """
+    Streaming variant of /recommendations/{user_id} as NDJSON events: the source
+    product first, then the ranked recommendations without LLM text, then each
+    summary and explanation as soon as it completes, and finally "done" with
+    the degradations the latency budget forced.
+    """
+    # Resolve the user up front so a missing user is still a plain 404
+    last_interaction = await asyncio.to_thread(get_last_user_interaction, user_id)
+    if not last_interaction:
+        raise HTTPException(status_code=404, detail=f"User with ID '{user_id}' not found or has no interactions.")
+    last_viewed_product_id, last_interaction_id = last_interaction
+    source_product_details = await asyncio.to_thread(get_product_details, last_viewed_product_id)
+    if not source_product_details:
+        raise HTTPException(status_code=404, detail=f"Source product with ID '{last_viewed_product_id}' not found.")
+
+    async def events():
+        degradations = start_budget()
+        source = dict(source_product_details)
+        source_summary_task = asyncio.ensure_future(summarize_product(dict(source)))
+        source.pop('summary', None)
+        yield _ndjson({"type": "source", "user_id": user_id, "source_product": source})
+
+        recommended_ids = await recommend_async(last_viewed_product_id, user_id, last_interaction_id=last_interaction_id)
+        products = await asyncio.to_thread(get_products, recommended_ids)
+        recs = [products[rec_id] for rec_id in recommended_ids if rec_id in products]
+        yield _ndjson({
+            "type": "recommendations",
+            "recommendations": [
+                {"product_id": rec['product_id'], "name": rec['name'], "category": rec['category']} for rec in recs
+            ]
+        })
+
+        pending = [_labeled("source_summary", -1, source_summary_task)]
+        for i, rec in enumerate(recs):
+            pending.append(_labeled("summary", i, summarize_product(dict(rec))))
+            pending.append(_labeled("explanation", i, run_llm_call(
+                generate_explanation, source_product=source_product_details, recommended_product=rec
+            )))
+        for next_done in asyncio.as_completed(pending):
+            kind, index, text = await next_done
+            if kind == "source_summary":
+                yield _ndjson({"type": "source_summary", "description": text})
+            elif kind == "summary":
+                yield _ndjson({"type": "summary", "index": index, "product_id": recs[index]['product_id'], "description": text})
+            else:
+                yield _ndjson({"type": "explanation", "index": index, "product_id": recs[index]['product_id'], "explanation": text})
+        yield _ndjson({"type": "done", "degradations": degradations})
+
+    return StreamingResponse(events(), media_type=NDJSON_MEDIA_TYPE)
+
+class ProductIn(BaseModel):
+    product_id: str
+    name: str
+    category: str = ''
+    description: str = ''
+
+@app.put("/products")
+async def upsert_products(products: List[ProductIn]):
+    """
+    Adds or replaces products in the catalog and the live recommender, without a restart.
+    """
+    rows = [p.model_dump() for p in products]
+    await asyncio.to_thread(save_products, rows)
+    await asyncio.to_thread(delete_precomputed_recommendations, [row['product_id'] for row in rows])
+    await asyncio.to_thread(recommender_engine.upsert_products, rows)
+    return {"upserted": len(products), "vocabulary_drift": recommender_engine.vocabulary_drift()}
+
+@app.delete("/products/{product_id}")
+async def delete_product(product_id: str):
+    """
+    Removes a product from the catalog and the live recommender.
+    """
+    if not await asyncio.to_thread(remove_product, product_id):
+        raise HTTPException(status_code=404, detail=f"Product with ID '{product_id}' not found.")
+    await asyncio.to_thread(delete_precomputed_recommendations, [product_id])
+    await asyncio.to_thread(recommender_engine.delete_products, [product_id])
+    return {"deleted": product_id}
+
+@app.post("/products/refit")
+def schedule_refit():
+    """
+    Starts a background full refit of the recommender from the database.
+    """
+    return {"scheduled": recommender_engine.schedule_refit()}
+
+class InteractionIn(BaseModel):
+    user_id: str
+    product_id: str
+    event_type: str = 'view'
+
+def record_interactions(batch):
+    """Writes a micro-batch of interactions and folds it into the co-occurrence model and cached user profiles."""
+    user_ids = {user_id for user_id, _, _ in batch}
+    histories = get_recent_interactions(user_ids, HISTORY_WINDOW)
+    # Profile loads overlapping the write aren't cached, so nothing has to wait on the database write
+    recommender_engine.profiles.begin_write(user_ids)
+    try:
+        interaction_ids = insert_interactions(batch)
+        recommender_engine.record_user_events(batch, interaction_ids)
+    finally:
+        recommender_engine.profiles.end_write(user_ids)
+    recommender_engine.record_interactions(batch, histories)
+
+def _database_locked(error):
+    """True for the lock contention errors that are worth retrying; anything else won't pass on a retry."""
+    message = str(error)
+    return 'locked' in message or 'busy' in message
+
+async def _write_interactions(batch, attempts):
+    """Writes batch, returning False if it was set aside to retry on the next flush."""
+    global interaction_retry
+    try:
+        await asyncio.to_thread(record_interactions, batch)
+    except sqlite3.OperationalError as e:
+        # Nothing was written, so a locked database can be retried a few times
+        if _database_locked(e) and attempts < INGEST_MAX_RETRIES:
+            interaction_retry = (batch, attempts + 1)
+            print(f"Could not write {len(batch)} interactions, retrying on the next flush: {e}")
+            return False
+        print(f"Dropping {len(batch)} interactions after {attempts + 1} attempts: {e}")
+    except Exception as e:
+        print(f"Failed to record {len(batch)} interactions: {e}")
+    return True
+
+async def flush_interactions():
+    global interaction_retry
+    if interaction_retry is not None:
+        batch, attempts = interaction_retry
+        interaction_retry = None
+        if not await _write_interactions(batch, attempts):
+            return
+    if not interaction_queue:
+        return
+    batch = interaction_queue[:]
+    del interaction_queue[:len(batch)]
+    await _write_interactions(batch, 0)
+
+async def flush_interactions_periodically():
+    while True:
+        try:
+            await asyncio.wait_for(interaction_flush_needed.wait(), timeout=INGEST_FLUSH_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        interaction_flush_needed.clear()
+        await flush_interactions()
+
+@app.post("/interactions", status_code=202)
+async def ingest_interactions(interactions: List[InteractionIn]):
+    """
+    Queues user interactions for ingestion. They are written to the database and
+    applied to the co-occurrence model in micro-batches within INGEST_FLUSH_SECONDS.
+    Returns 503 while INGEST_MAX_QUEUE interactions are already waiting.
+    """
+    if len(interaction_queue) + len(interactions) > INGEST_MAX_QUEUE:
+        raise HTTPException(
+            status_code=503, detail="Interaction queue is full, retry later.",
+            headers={"Retry-After": str(max(1, round(INGEST_FLUSH_SECONDS)))}
+        )
+    interaction_queue.extend((i.user_id, i.product_id, i.event_type) for i in interactions)
+    if len(interaction_queue) >= INGEST_BATCH_SIZE:
+        interaction_flush_needed.set()
+    return {"queued": len(interactions)}
+
+class BatchRecommendationRequest(BaseModel):
+    user_ids: List[str]
+    include_llm_text: bool = True # Set to False to skip every LLM call: summaries, explanations and search terms
+
+async def _batch_chunk_results(user_ids: List[str], include_llm_text: bool, recs_by_source: dict):
+    """
+    Builds the response rows for one chunk of users. Each distinct source product's
+    recommendations are computed once and memoized in recs_by_source across chunks.
+    """
+    last_interactions = await asyncio.to_thread(get_last_user_interactions, user_ids)
+
+    new_sources = [pid for pid in dict.fromkeys(last_interactions.values()) if pid not in recs_by_source]
+    # Without LLM text the whole batch stays LLM-free, including the search-term expansion
+    computed = await asyncio.gather(*[
+        recommend_async(pid, use_llm=include_llm_text)
+        for pid in new_sources
+    ])
+    recs_by_source.update(zip(new_sources, computed))
+
+    needed_ids = set(last_interactions.values())
+    for pid in set(last_interactions.values()):
+        needed_ids.update(recs_by_source[pid])
+    products = await asyncio.to_thread(get_products, needed_ids)
+
+    summaries, explanations = {}, {}
+    if include_llm_text:
+        # Summaries are needed once per product and explanations once per (source, recommendation) pair
+        summary_ids = [pid for pid in needed_ids if pid in products]
+        pairs = list({
+            (source_id, rec_id)
+            for source_id in set(last_interactions.values()) if source_id in products
+            for rec_id in recs_by_source[source_id] if rec_id in products
+        })
+        summary_values, explanation_values = await asyncio.gather(
+            asyncio.gather(*[summarize_product(dict(products[pid])) for pid in summary_ids]),
+            asyncio.gather(*[
+                run_llm_call(generate_explanation, source_product=products[source_id], recommended_product=products[rec_id])
+                for source_id, rec_id in pairs
+            ]),
+        )
+        summaries = dict(zip(summary_ids, summary_values))
+        explanations = dict(zip(pairs, explanation_values))
+
+    def product_view(product_id):
+        product = dict(products[product_id])
+        summary = product.pop('summary', None)
+        if include_llm_text:
+            product['description'] = summaries[product_id]
+        elif summary:
+            product['description'] = summary
+        return product
+
+    results = []
+    for user_id in user_ids:
+        source_id = last_interactions.get(user_id)
+        if not source_id:
+            results.append({"user_id": user_id, "error": "User not found or has no interactions."})
+            continue
+        if source_id not in products:
+            results.append({"user_id": user_id, "error": f"Source product with ID '{source_id}' not found."})
+            continue
+        recommendations = []
+        for rec_id in recs_by_source[source_id]:
+            if rec_id in products:
+                rec = {"recommended_product": product_view(rec_id)}
+                if include_llm_text:
+                    rec["explanation"] = explanations[(source_id, rec_id)]
+                recommendations.append(rec)
+        results.append({
+            "user_id": user_id,
+            "source_product": product_view(source_id),
+            "recommendations": recommendations
+        })
+    return results
+
+@app.post("/recommendations/batch")
+async def get_recommendations_batch(request: BatchRecommendationRequest):
+    """
+    Generates recommendations for many users in one call, streamed back as
+    NDJSON (one JSON object per user, in request order).
+    """
+    async def stream():
+        recs_by_source = {}
+        for start in range(0, len(request.user_ids), BATCH_CHUNK_SIZE):
+            chunk = request.user_ids[start:start + BATCH_CHUNK_SIZE]
+            for result in await _batch_chunk_results(chunk, request.include_llm_text, recs_by_source):
+                yield json.dumps(result) + "\n"
+
+    return StreamingResponse(stream(), media_type=NDJSON_MEDIA_TYPE)
@@ -0,0 +1,151 @@
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# --- Configuration ---
+# Latency buckets in seconds, from sub-millisecond index lookups up to slow LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = []
+_collectors = []
+# Per-request stage timings, only set when the caller opted in to the breakdown
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+_timings_lock = threading.Lock()
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    """A monotonically increasing Prometheus counter with optional labels."""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {value}')
+        return lines
+
+
+class Histogram:
+    """A Prometheus histogram with cumulative buckets, a sum and a count per label set."""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            series = self._values.setdefault(key, {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, series in sorted(self._values.items()):
+                for bound, bucket_count in zip(self.buckets, series['buckets']):
+                    lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, [("le", bound)])} {bucket_count}')
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, [("le", "+Inf")])} {series["count"]}')
+                lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {series["sum"]}')
+                lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {series["count"]}')
+        return lines
+
+
+def register_gauge_collector(func):
+    """
+    Registers a function returning [(name, documentation, value), ...] that is
+    evaluated at scrape time, for values owned by other modules (e.g. cache stats).
+    """
+    _collectors.append(func)
+    return func
+
+
+def render_metrics():
+    """Returns every registered metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        for name, documentation, value in collector():
+            lines.extend([f'# HELP {name} {documentation}', f'# TYPE {name} gauge', f'{name} {value}'])
+    return '\n'.join(lines) + '\n'
+
+
+# --- Application metrics ---
+STAGE_SECONDS = Histogram(
+    'recommender_stage_duration_seconds',
+    'Time spent in each stage of serving a recommendation.',
+    labelnames=('stage',)
+)
+REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds',
+    'End-to-end HTTP request latency.',
+    labelnames=('method', 'route', 'status')
+)
+LLM_CALLS = Counter('llm_calls_total', 'LLM completions requested from the provider.', labelnames=('model',))
+LLM_ERRORS = Counter('llm_errors_total', 'LLM completions that raised an error.', labelnames=('model',))
+LLM_TOKENS = Counter('llm_tokens_total', 'Tokens consumed by LLM completions.', labelnames=('model', 'type'))
+
+
+def start_request_timings():
+    """Opts the current request in to a per-stage timing breakdown."""
+    timings = {}
+    _request_timings.set(timings)
+    return timings
+
+
+@contextmanager
+def timer(stage):
+    """Times a block into the stage histogram and, if enabled, the current request's breakdown."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            with _timings_lock:
+                timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+def timed(stage):
+    """Decorator form of timer()."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def format_server_timing(timings):
+    """Formats a timing breakdown as a Server-Timing header value (durations in ms)."""
+    return ', '.join(f'{stage};dur={seconds * 1000:.1f}' for stage, seconds in timings.items())
@@ -0,0 +1,140 @@
+import os
+import threading
+from collections import OrderedDict, deque
+
+import numpy as np
+import scipy.sparse as sp
+
+from .collaborative import EVENT_WEIGHTS
+
+# --- Configuration ---
+PROFILE_HISTORY = int(os.getenv("PROFILE_HISTORY", "20")) # Most recent interactions a profile is built from
+PROFILE_RECENCY_DECAY = float(os.getenv("PROFILE_RECENCY_DECAY", "0.8")) # Weight multiplier per step back in a user's history
+PROFILE_CACHE_MAX_USERS = int(os.getenv("PROFILE_CACHE_MAX_USERS", "100000")) # Profiles kept in memory (LRU)
+
+
+class UserProfile:
+    """
+    A user's last PROFILE_HISTORY interactions, as (row position, event weight),
+    and the profile vector built from them: the sum of the products' vectors
+    weighted by event type and by PROFILE_RECENCY_DECAY per step of age,
+    L2-normalized so a dot product with a catalog row is a cosine similarity.
+    last_interaction_id is the newest user_interactions row the profile is
+    known to include; a newer row means another worker recorded events for
+    the user and the profile has to be reloaded.
+    """
+
+    def __init__(self, last_interaction_id=0):
+        self.history = deque(maxlen=PROFILE_HISTORY)
+        self.vector = None
+        self.last_interaction_id = last_interaction_id
+
+    def add(self, position, event_type):
+        self.history.append((position, EVENT_WEIGHTS.get(event_type, 1.0)))
+
+    def positions(self):
+        return np.fromiter((position for position, _ in self.history), dtype=np.int32, count=len(self.history))
+
+    def refresh(self, vectors):
+        """Rebuilds the vector from the history against vectors (TF-IDF matrix or embeddings)."""
+        if not self.history:
+            self.vector = None
+            return
+        ages = np.arange(len(self.history) - 1, -1, -1)
+        weights = np.fromiter((weight for _, weight in self.history), dtype=np.float64) * PROFILE_RECENCY_DECAY ** ages
+        rows = vectors[self.positions()]
+        if sp.issparse(rows):
+            vector = sp.csr_matrix(weights.astype(rows.dtype)[np.newaxis]) @ rows # 1 x vocabulary, stays sparse
+            norm = np.linalg.norm(vector.data)
+        else:
+            vector = (weights @ rows).astype(np.float32)
+            norm = np.linalg.norm(vector)
+        self.vector = vector / norm if norm else None
+
+
+class _PendingLoad:
+    __slots__ = ('stale',)
+
+    def __init__(self, stale):
+        self.stale = stale
+
+
+class ProfileCache:
+    """
+    LRU of UserProfiles. `lock` only guards short in-memory sections: callers
+    hold it around get() and put() and while changing a cached profile, and
+    nothing holds it across a database query. A profile loaded from the table
+    is only cached if no write for that user overlapped the load (see
+    begin_load() and begin_write()), so an event is never counted twice or
+    missed, and loads for different users never wait on each other.
+    """
+
+    def __init__(self, max_users=PROFILE_CACHE_MAX_USERS):
+        self.max_users = max_users
+        self.lock = threading.Lock()
+        self._profiles = OrderedDict()
+        self._loads = {} # user_id -> loads in progress
+        self._writes = {} # user_id -> writes in progress
+
+    def get(self, user_id):
+        profile = self._profiles.get(user_id)
+        if profile is not None:
+            self._profiles.move_to_end(user_id)
+        return profile
+
+    def discard(self, user_id):
+        self._profiles.pop(user_id, None)
+
+    def put(self, user_id, profile):
+        self._profiles[user_id] = profile
+        self._profiles.move_to_end(user_id)
+        while len(self._profiles) > self.max_users:
+            self._profiles.popitem(last=False)
+
+    def begin_load(self, user_id):
+        """Registers a history load for user_id, before its query runs. Pass the result to finish_load()."""
+        with self.lock:
+            load = _PendingLoad(stale=self._writes.get(user_id, 0) > 0)
+            self._loads.setdefault(user_id, []).append(load)
+            return load
+
+    def finish_load(self, user_id, load, profile):
+        """
+        Caches profile unless a write or a clear() overlapped its load; returns
+        whether it was cached. Pass profile=None when the load failed.
+        """
+        with self.lock:
+            loads = self._loads[user_id]
+            loads.remove(load)
+            if not loads:
+                del self._loads[user_id]
+            if load.stale or profile is None or user_id in self._profiles:
+                return False
+            self.put(user_id, profile)
+            return True
+
+    def begin_write(self, user_ids):
+        """Call before persisting new events for user_ids; loads running meanwhile won't be cached."""
+        with self.lock:
+            for user_id in user_ids:
+                self._writes[user_id] = self._writes.get(user_id, 0) + 1
+                for load in self._loads.get(user_id, ()):
+                    load.stale = True
+
+    def end_write(self, user_ids):
+        """Call once the events are persisted and folded into the cached profiles (or the write failed)."""
+        with self.lock:
+            for user_id in user_ids:
+                self._writes[user_id] -= 1
+                if not self._writes[user_id]:
+                    del self._writes[user_id]
+
+    def clear(self):
+        """Drops every profile; callers hold lock. Loads in progress were built on the old state and aren't cached."""
+        self._profiles.clear()
+        for loads in self._loads.values():
+            for load in loads:
+                load.stale = True
+
+    def __len__(self):
+        return len(self._profiles)
@@ -1,29 +1,92 @@
 import pandas as pd
 import sqlite3
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.decomposition import TruncatedSVD
+import numpy as np
 import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+import scipy.sparse as sp
 import inflect  # For handling pluralization
-from .llm_handler import client as groq_client # Import the Groq client directly
+from .llm_handler import cached_completion
+from .budget import record_degradation
+from .artifacts import artifact_catalog_version, build_lock, current_artifact_dir, load_artifacts, save_artifacts
+from .db import read_catalog_version
+from .metrics import timed, timer
+from .collaborative import CoOccurrenceModel
+from .profiles import ProfileCache, UserProfile
 
 # --- Configuration ---
 DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'db.sqlite3')
 PRODUCTS_TABLE_NAME = 'products'
+NEIGHBORS_K = 50 # Number of most similar products kept per item
+# Scratch memory one scoring block may use; rows per block are derived from it and the catalog size
+SIMILARITY_BLOCK_BYTES = int(os.getenv("SIMILARITY_BLOCK_BYTES", str(256 * 2**20)))
+SCORE_BYTES_PER_CELL = 12 # float32 similarity plus the int64 argpartition result, per (row, product) pair
+# "tfidf" scores neighbors on the sparse TF-IDF vectors, "lsa" on dense TruncatedSVD embeddings of them
+SIMILARITY_MODE = os.getenv("SIMILARITY_MODE", "tfidf")
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "192")) # LSA embedding size
+SIMILARITY_WORKERS = int(os.getenv("SIMILARITY_WORKERS", "1")) # Threads scoring neighbor blocks in parallel
+# Share of the tail score taken from co-occurrence. Opt-in: enabling it makes every worker stream the whole
+# user_interactions table at startup to build its own copy of the model
+CF_BLEND_WEIGHT = float(os.getenv("CF_BLEND_WEIGHT", "0"))
+REFIT_DRIFT_THRESHOLD = float(os.getenv("REFIT_DRIFT_THRESHOLD", "0.2")) # Share of upserted tokens missing from the vocabulary
+REFIT_MIN_UPSERTED_TOKENS = int(os.getenv("REFIT_MIN_UPSERTED_TOKENS", "5000")) # Drift is only acted on past this many tokens
 p = inflect.engine() # Initialize the pluralization engine
+TOKEN_PATTERN = r'\w+' # Same notion of a "word" as the \b boundaries in the keyword regex
+REGEX_METACHARS = set('.^$*+?{}[]\\|()')
+ENCODED_COLUMNS = ('product_id', 'name', 'category') # Kept as int32 codes for the ranking hot path
 
 class Recommender:
-    def __init__(self):
+    def __init__(self, artifact_dir=None):
+        """
+        Builds the model from the database, or memory-maps a prebuilt one from
+        artifact_dir (see build_artifacts.py) for near-instant startup.
+        """
         print("Initializing hybrid recommender...")
-        self.df = self._load_product_data()
-        self._prepare_data()
-        self.tfidf_vectorizer, self.tfidf_matrix = self._compute_tfidf()
-        self.cosine_sim = self._compute_similarity_matrix()
-        self.indices = pd.Series(self.df.index, index=self.df['product_id']).drop_duplicates()
+        self._lock = threading.RLock() # Guards the model state against concurrent upserts and refits
+        self._refit_log = None # Upserts/deletes received while a background refit is running
+        self._replaying = False
+        self.oov_token_count, self.upserted_token_count = 0, 0
+        self.collaborative = None # Optional CoOccurrenceModel, see enable_collaborative()
+        self.profiles = ProfileCache() # Session profiles per user, see recommend_for_user()
+        self._profiles_generation = 0 # Bumped when a refit invalidates the row positions profiles refer to
+        # Refits of a model served from artifacts are saved as a new version next to it
+        self._artifact_root = os.path.dirname(os.path.normpath(artifact_dir)) if artifact_dir else None
+        if artifact_dir:
+            print(f"Loading prebuilt artifacts from {artifact_dir}...")
+            artifacts = load_artifacts(artifact_dir)
+            self.catalog_version = artifacts['catalog_version']
+            self.df = artifacts['df'].drop(columns='soup', errors='ignore') # Older artifacts stored it
+            self.tfidf_vectorizer, self.tfidf_matrix = artifacts['tfidf_vectorizer'], artifacts['tfidf_matrix']
+            self.svd, self.embeddings = artifacts['svd'], artifacts['embeddings']
+            self.neighbor_ids, self.neighbor_scores = artifacts['neighbor_ids'], artifacts['neighbor_scores']
+            self.deleted = artifacts['deleted']
+            self.indices = pd.Series(self.df.index, index=self.df['product_id'])[~self.deleted].drop_duplicates()
+            self.token_index = artifacts['token_index']
+            self._encode_columns()
+        else:
+            self.df = self._load_product_data()
+            self._prepare_data()
+            self.tfidf_vectorizer, self.tfidf_matrix = self._compute_tfidf()
+            self.svd, self.embeddings = self._compute_embeddings() if SIMILARITY_MODE == 'lsa' else (None, None)
+            self.deleted = np.zeros(len(self.df), dtype=bool) # Tombstones for products removed at runtime
+            self.neighbor_ids, self.neighbor_scores = self._compute_neighbor_index()
+            self.indices = pd.Series(self.df.index, index=self.df['product_id']).drop_duplicates()
+            self.token_index = self._build_token_index()
+            # Everything that needed the combined text has it now; _soup() rebuilds it for the few rows that need it later
+            self.df.drop(columns='soup', inplace=True)
+            self._encode_columns()
         print("Recommender initialized successfully.")
 
     def _load_product_data(self):
+        self.catalog_version = 0 # Version of the catalog the model is fitted on, see api/db.py
         try:
             conn = sqlite3.connect(DB_PATH)
+            # Read before the products, so a write in between makes the model look stale rather than fresh
+            self.catalog_version = read_catalog_version(conn)
             query = f"SELECT * FROM {PRODUCTS_TABLE_NAME};"
             df = pd.read_sql_query(query, conn)
             conn.close()
@@ -40,15 +103,470 @@ class Recommender:
         self.df['soup'] = self.df['name'] + ' ' + self.df['category'] + ' ' + self.df['description']
         print("Created 'soup' column for text analysis.")
         
+    def _encode_columns(self):
+        """
+        Factorizes the columns the ranking filters on into int32 codes (equal
+        values share a code), so filters are NumPy comparisons instead of
+        string work on DataFrame rows.
+        """
+        self._codes, self._vocab = {}, {}
+        for column in ENCODED_COLUMNS:
+            codes, uniques = pd.factorize(self.df[column])
+            self._codes[column] = codes.astype(np.int32)
+            self._vocab[column] = dict(zip(uniques, range(len(uniques))))
+
+    def _encode(self, column, values):
+        """Codes for values of column, assigning new codes to values not seen before."""
+        vocab = self._vocab[column]
+        return np.array([vocab.setdefault(value, len(vocab)) for value in values], dtype=np.int32)
+
+    def _soup(self, positions):
+        """The text the TF-IDF and keyword indexes were built from, for the given rows."""
+        rows = self.df.iloc[positions]
+        return rows['name'] + ' ' + rows['category'] + ' ' + rows['description']
+
     def _compute_tfidf(self):
         tfidf = TfidfVectorizer(stop_words='english')
         tfidf_matrix = tfidf.fit_transform(self.df['soup'])
         return tfidf, tfidf_matrix
 
-    def _compute_similarity_matrix(self):
-        # This is now only used as a fallback
-        return cosine_similarity(self.tfidf_matrix, self.tfidf_matrix)
+    def _compute_embeddings(self, dimensions=EMBEDDING_DIMENSIONS):
+        """
+        Reduces the TF-IDF matrix to dense, L2-normalized float32 LSA vectors, so
+        neighbor scoring is a plain dense matrix product over a compact matrix.
+        """
+        n, num_terms = self.tfidf_matrix.shape
+        dimensions = min(dimensions, num_terms - 1, n - 1)
+        if dimensions < 1:
+            return None, None
+        svd = TruncatedSVD(n_components=dimensions, random_state=0)
+        embeddings = self._normalize(svd.fit_transform(self.tfidf_matrix))
+        print(f"Reduced TF-IDF to {dimensions}-dimensional LSA embeddings "
+              f"({svd.explained_variance_ratio_.sum():.0%} of variance).")
+        return svd, embeddings
+
+    @staticmethod
+    def _normalize(vectors):
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1 # Empty documents stay all-zero
+        return (vectors / norms).astype(np.float32)
+
+    def _project(self, tfidf_rows):
+        """Maps TF-IDF rows into the space neighbors are scored in."""
+        if self.embeddings is None:
+            return tfidf_rows
+        return self._normalize(self.svd.transform(tfidf_rows))
+
+    def _vectors(self):
+        return self.tfidf_matrix if self.embeddings is None else self.embeddings
+
+    def _build_token_index(self):
+        """
+        Builds an inverted index mapping each lowercase token of the 'soup' column
+        to a sorted int32 array of the row positions that contain it.
+        """
+        tokens = self.df['soup'].str.lower().str.findall(TOKEN_PATTERN).explode().dropna()
+        postings = pd.DataFrame({'token': tokens.to_numpy(), 'row': tokens.index.to_numpy()}).drop_duplicates()
+        rows = postings['row'].to_numpy(dtype=np.int32)
+        token_index = {token: np.sort(rows[positions]) for token, positions in postings.groupby('token').indices.items()}
+        print(f"Built inverted index over {len(token_index)} tokens.")
+        return token_index
+
+    @staticmethod
+    def _block_size(n, budget=SIMILARITY_BLOCK_BYTES):
+        """Rows per scoring block so that one block's scratch arrays fit in budget bytes."""
+        return max(1, budget // (max(n, 1) * SCORE_BYTES_PER_CELL))
+
+    def _compute_neighbor_index(self, k=NEIGHBORS_K, block_size=None, workers=SIMILARITY_WORKERS):
+        """
+        Keeps only the top-k most similar products per item instead of the full
+        N x N cosine matrix. Rows are scored in blocks sized from
+        SIMILARITY_BLOCK_BYTES, so peak memory per worker stays bounded however
+        large the catalog grows. TF-IDF rows (and LSA embeddings) are
+        L2-normalized, so a dot product is the cosine similarity.
+        """
+        n = self.tfidf_matrix.shape[0]
+        k = max(0, min(k, n - 1))
+        neighbor_ids = np.zeros((n, k), dtype=np.int32)
+        neighbor_scores = np.zeros((n, k), dtype=np.float32)
+        if k == 0:
+            return neighbor_ids, neighbor_scores
+
+        block_size = block_size or self._block_size(n)
+        matrix_t = self._scoring_matrix_t()
+
+        def score_block(start):
+            end = min(start + block_size, n)
+            neighbor_ids[start:end], neighbor_scores[start:end] = self._top_k_neighbors(np.arange(start, end), k, matrix_t)
+
+        # Blocks write disjoint rows, and the dense products release the GIL, so shards can run on threads
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            list(pool.map(score_block, range(0, n, block_size)))
+        print(f"Built top-{k} neighbor index for {n} products.")
+        return neighbor_ids, neighbor_scores
+
+    def _scoring_matrix_t(self):
+        # Scores are kept as float32 (like neighbor_scores), halving the scratch memory of every block
+        vectors = self._vectors()
+        if sp.issparse(vectors):
+            return vectors.T.tocsc().astype(np.float32, copy=False)
+        return vectors.T.astype(np.float32, copy=False)
+
+    def _top_k_neighbors(self, positions, k, matrix_t):
+        """Scores the given rows against the whole catalog and returns their top-k neighbors."""
+        sims = self._vectors()[positions].astype(np.float32, copy=False) @ matrix_t
+        sims = sims.toarray() if sp.issparse(sims) else sims
+        sims[np.arange(len(positions)), positions] = -np.inf # Never list an item as its own neighbor
+        sims[:, self.deleted] = -np.inf
+
+        # Partitioning in place of the negated copy: the k largest end up in the last k columns
+        n = sims.shape[1]
+        top = np.argpartition(sims, n - k, axis=1)[:, n - k:]
+        top_scores = np.take_along_axis(sims, top, axis=1)
+        # Sort by descending score, breaking ties by position like a stable sort would
+        order = np.lexsort((top, -top_scores), axis=1)
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+    def _refresh_neighbors(self, positions, block_size=None):
+        """Recomputes the neighbor lists of the given rows only."""
+        k = self.neighbor_ids.shape[1]
+        if k == 0 or len(positions) == 0:
+            return
+        block_size = block_size or self._block_size(self.tfidf_matrix.shape[0])
+        matrix_t = self._scoring_matrix_t()
+        for start in range(0, len(positions), block_size):
+            block = positions[start:start + block_size]
+            self.neighbor_ids[block], self.neighbor_scores[block] = self._top_k_neighbors(block, k, matrix_t)
+
+    def _make_writable(self):
+        # Arrays memory-mapped from artifacts are read-only; copy them before the first update
+        if not self.neighbor_ids.flags.writeable:
+            self.neighbor_ids = np.array(self.neighbor_ids)
+            self.neighbor_scores = np.array(self.neighbor_scores)
+            self.deleted = np.array(self.deleted)
+            self.tfidf_matrix = sp.csr_matrix(self.tfidf_matrix, copy=True)
+            if self.embeddings is not None:
+                self.embeddings = np.array(self.embeddings)
+
+    @staticmethod
+    def _positions_by_token(rows):
+        """Groups (position, soup) pairs into a sorted int32 array of positions per token."""
+        grouped = {}
+        for position, soup in rows:
+            for token in set(re.findall(TOKEN_PATTERN, soup.lower())):
+                grouped.setdefault(token, []).append(position)
+        return {token: np.unique(np.array(positions, dtype=np.int32)) for token, positions in grouped.items()}
+
+    def _reindex_tokens(self, removals=(), additions=()):
+        """
+        Applies a whole batch of (position, soup) removals and additions to the
+        inverted index, rewriting each affected posting list once. Lists of
+        common words are about as long as the catalog, so per-row updates
+        would cost a full pass over them for every row.
+        """
+        removed, added = self._positions_by_token(removals), self._positions_by_token(additions)
+        for token in removed.keys() | added.keys():
+            rows = self.token_index.get(token, np.empty(0, dtype=np.int32))
+            if token in removed:
+                rows = np.setdiff1d(rows, removed[token], assume_unique=True)
+            if token in added:
+                new_rows = added[token]
+                if len(rows) == 0 or new_rows[0] > rows[-1]:
+                    rows = np.concatenate([rows, new_rows]) # Appended rows sort after every existing one
+                else:
+                    rows = np.union1d(rows, new_rows)
+            self.token_index[token] = rows.astype(np.int32, copy=False)
+
+    def upsert_products(self, products):
+        """
+        Adds new products or replaces existing ones (matched on product_id) without
+        a full refit. New text is transformed with the existing vectorizer, and
+        only the neighbor lists that can change are recomputed: the upserted rows,
+        rows that listed an upserted product, and rows it now outranks.
+        """
+        rows = pd.DataFrame(products, columns=['product_id', 'name', 'category', 'description'])
+        rows = rows.drop_duplicates('product_id', keep='last').fillna('').reset_index(drop=True)
+        if rows.empty:
+            return
+        rows['soup'] = rows['name'] + ' ' + rows['category'] + ' ' + rows['description']
+
+        with self._lock:
+            if self._refit_log is not None:
+                self._refit_log.append(('upsert_products', products))
+            self._make_writable()
+
+            n = len(self.df)
+            is_existing = rows['product_id'].isin(self.indices.index).to_numpy()
+            updated = self.indices[rows.loc[is_existing, 'product_id']].to_numpy(dtype=np.int32)
+            appended = np.arange(n, n + (~is_existing).sum(), dtype=np.int32)
+            positions = np.empty(len(rows), dtype=np.int32)
+            positions[is_existing], positions[~is_existing] = updated, appended
+
+            # Catalog, id index and keyword index
+            replaced_text = list(zip(updated, self._soup(updated)))
+            columns = ['product_id', 'name', 'category', 'description']
+            if len(updated):
+                self.df.loc[updated, columns] = rows.loc[is_existing, columns].to_numpy()
+            if len(appended):
+                new_rows = rows.loc[~is_existing, columns].set_axis(appended)
+                self.df = pd.concat([self.df, new_rows])
+                self.indices = pd.concat([self.indices, pd.Series(appended, index=new_rows['product_id'])])
+                self.deleted = np.concatenate([self.deleted, np.zeros(len(appended), dtype=bool)])
+            for column in ENCODED_COLUMNS:
+                codes = self._encode(column, rows[column])
+                self._codes[column] = np.concatenate([self._codes[column], codes[~is_existing]])
+                self._codes[column][updated] = codes[is_existing]
+            self._reindex_tokens(replaced_text, zip(positions, rows['soup']))
+
+            # TF-IDF rows: zero out the replaced rows, grow for the new ones, then place the new vectors
+            vectors = self.tfidf_vectorizer.transform(rows['soup']).astype(self.tfidf_matrix.dtype)
+            keep = np.ones(n, dtype=self.tfidf_matrix.dtype)
+            keep[updated] = 0
+            matrix = sp.diags(keep) @ self.tfidf_matrix
+            matrix = sp.vstack([matrix, sp.csr_matrix((len(appended), matrix.shape[1]), dtype=matrix.dtype)])
+            placement = sp.csr_matrix(
+                (np.ones(len(rows), dtype=matrix.dtype), (positions, np.arange(len(rows)))),
+                shape=(matrix.shape[0], len(rows))
+            )
+            self.tfidf_matrix = (matrix + placement @ vectors).tocsr()
+            self.tfidf_matrix.eliminate_zeros()
+            projected = self._project(vectors)
+            if self.embeddings is not None:
+                self.embeddings = np.vstack([self.embeddings, np.zeros((len(appended), self.embeddings.shape[1]), dtype=np.float32)])
+                self.embeddings[positions] = projected
+
+            # Neighbor lists
+            k = self.neighbor_ids.shape[1]
+            self.neighbor_ids = np.vstack([self.neighbor_ids, np.zeros((len(appended), k), dtype=np.int32)])
+            self.neighbor_scores = np.vstack([self.neighbor_scores, np.zeros((len(appended), k), dtype=np.float32)])
+            if k:
+                listed_stale = np.isin(self.neighbor_ids, updated).any(axis=1)
+                sims = self._vectors() @ projected.T
+                sims = (sims.toarray() if sp.issparse(sims) else sims).max(axis=1)
+                outranked = sims > self.neighbor_scores[:, -1]
+                affected = np.flatnonzero((listed_stale | outranked) & ~self.deleted)
+                self._refresh_neighbors(np.union1d(affected, positions).astype(np.int32))
+
+            # Track how much of the new text the fitted vocabulary can't represent
+            analyzer = self.tfidf_vectorizer.build_analyzer()
+            for soup in rows['soup']:
+                terms = analyzer(soup)
+                self.upserted_token_count += len(terms)
+                self.oov_token_count += sum(term not in self.tfidf_vectorizer.vocabulary_ for term in terms)
+            print(f"Upserted {len(updated)} updated and {len(appended)} new products.")
+
+        # A handful of upserted tokens says nothing about the catalog, so drift needs a minimum sample
+        if (not self._replaying and self.upserted_token_count >= REFIT_MIN_UPSERTED_TOKENS
+                and self.vocabulary_drift() > REFIT_DRIFT_THRESHOLD):
+            print(f"Vocabulary drift is {self.vocabulary_drift():.0%}, scheduling a full refit.")
+            self.schedule_refit()
+
+    def delete_products(self, product_ids):
+        """
+        Removes products at runtime. Rows are tombstoned rather than dropped so
+        positions stay stable; neighbor lists that referenced them are recomputed.
+        """
+        with self._lock:
+            if self._refit_log is not None:
+                self._refit_log.append(('delete_products', product_ids))
+            self._make_writable()
+            ids = [product_id for product_id in product_ids if product_id in self.indices]
+            positions = self.indices[ids].to_numpy(dtype=np.int32)
+            if len(positions) == 0:
+                return
+            self._reindex_tokens(removals=zip(positions, self._soup(positions)))
+            self.deleted[positions] = True
+            self.indices = self.indices.drop(ids)
+            if self.neighbor_ids.shape[1]:
+                affected = np.flatnonzero(np.isin(self.neighbor_ids, positions).any(axis=1) & ~self.deleted)
+                self._refresh_neighbors(affected.astype(np.int32))
+            print(f"Deleted {len(positions)} products.")
+
+    def vocabulary_drift(self):
+        """Share of tokens in upserted text since the last fit that the vectorizer doesn't know."""
+        return self.oov_token_count / self.upserted_token_count if self.upserted_token_count else 0.0
+
+    def schedule_refit(self):
+        """
+        Starts a full refit from the database in a background thread. Upserts and
+        deletes that arrive meanwhile are replayed onto the new model before it is
+        swapped in, so callers must persist changes to the database before applying
+        them here. Returns False if a refit is already running.
+        """
+        with self._lock:
+            if self._refit_log is not None:
+                return False
+            self._refit_log = []
+        threading.Thread(target=self._refit, name="recommender-refit", daemon=True).start()
+        return True
+
+    def enable_collaborative(self):
+        """Builds the item-item co-occurrence model from user_interactions and blends it into the tail ranking."""
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            model = CoOccurrenceModel.build(conn, self.indices, len(self.df))
+        finally:
+            conn.close()
+        with self._lock:
+            self.collaborative = model
+
+    def record_interactions(self, events, histories):
+        """
+        Updates the co-occurrence model with new (user_id, product_id, event_type)
+        events; histories maps user_id to their earlier (product_id, event_type) events.
+        """
+        if self.collaborative is None:
+            return
+        with self._lock:
+            events = [(user_id, self.indices[pid], event) for user_id, pid, event in events if pid in self.indices]
+            histories = {
+                user_id: [(self.indices[pid], event) for pid, event in history if pid in self.indices]
+                for user_id, history in histories.items()
+            }
+        self.collaborative.add_events(events, histories)
+
+    def record_user_events(self, events, interaction_ids):
+        """
+        Folds new (user_id, product_id, event_type) events, stored under
+        interaction_ids, into the cached profiles of those users. Callers bracket
+        persisting the events and this call with profiles.begin_write() and
+        profiles.end_write() (see ProfileCache).
+        """
+        with self._lock, self.profiles.lock:
+            touched = {}
+            for (user_id, product_id, event_type), interaction_id in zip(events, interaction_ids):
+                profile = self.profiles.get(user_id)
+                if profile is None:
+                    continue
+                profile.last_interaction_id = interaction_id
+                if product_id in self.indices:
+                    profile.add(self.indices[product_id], event_type)
+                    touched[user_id] = profile
+            vectors = self._vectors()
+            for profile in touched.values():
+                profile.refresh(vectors)
+
+    def recommend_for_user(self, user_id, load_history, num_recs=5, last_interaction_id=0):
+        """
+        Session-aware recommendations from the user's profile vector (see
+        api/profiles.py). load_history(user_id) returns their most recent
+        (product_id, event_type) events, oldest first; it is only called when the
+        profile isn't cached, outside every lock. last_interaction_id is the
+        user's newest interaction_id, looked up beforehand; a cached profile
+        older than that missed events written by another worker and is
+        reloaded. Returns [] when the user has no usable history.
+        """
+        with self.profiles.lock:
+            profile = self.profiles.get(user_id)
+            if profile is not None and profile.last_interaction_id < last_interaction_id:
+                self.profiles.discard(user_id)
+                profile = None
+            if profile is not None:
+                vector, positions, generation = profile.vector, profile.positions(), self._profiles_generation
+        if profile is None:
+            load, profile = self.profiles.begin_load(user_id), None
+            try:
+                history = load_history(user_id)
+                # The history was read after last_interaction_id was looked up, so it includes at least that row
+                built = UserProfile(last_interaction_id)
+                with self._lock:
+                    for product_id, event_type in history:
+                        if product_id in self.indices:
+                            built.add(self.indices[product_id], event_type)
+                    built.refresh(self._vectors())
+                    generation = self._profiles_generation
+                vector, positions, profile = built.vector, built.positions(), built
+            finally:
+                # Not cached if new events or a refit raced with the load; this request still uses it
+                self.profiles.finish_load(user_id, load, profile)
+        if vector is None:
+            return []
+        with self._lock:
+            if generation != self._profiles_generation:
+                return [] # A refit moved the rows while we were away
+            return self._rank_for_profile(vector, positions, num_recs)
+
+    @timed('profile_ranking')
+    def _rank_for_profile(self, vector, positions, num_recs):
+        """
+        Scores the neighbors of every product in the history against the profile
+        vector in one matrix-vector product, so the cost stays close to a single
+        product's tail ranking instead of a pass over the whole catalog.
+        """
+        candidates = np.unique(np.concatenate([np.asarray(self._tail_candidates(p)) for p in np.unique(positions)]))
+        id_codes, name_codes = self._codes['product_id'], self._codes['name']
+        # Leave out what the user already interacted with, and products named like it
+        seen_ids = np.zeros(len(self._vocab['product_id']), dtype=bool)
+        seen_ids[id_codes[positions]] = True
+        seen_names = np.zeros(len(self._vocab['name']), dtype=bool)
+        seen_names[name_codes[positions]] = True
+        candidates = candidates[
+            ~self.deleted[candidates] & ~seen_ids[id_codes[candidates]] & ~seen_names[name_codes[candidates]]
+        ]
+        if len(candidates) == 0:
+            return []
 
+        scores = self._vectors()[candidates] @ vector.T
+        scores = np.asarray(scores.toarray() if sp.issparse(scores) else scores).ravel()
+        # Best first, ties broken by position; then keep the best row per product id
+        ranked = candidates[np.lexsort((candidates, -scores))]
+        _, first = np.unique(id_codes[ranked], return_index=True)
+        ranked = ranked[np.sort(first)][:num_recs]
+        return self.df['product_id'].to_numpy()[ranked].tolist()
+
+    def _fit_shared(self):
+        """
+        Refit of a model served from artifacts. Processes sharing the artifact
+        root take turns under the build lock: the first fits the catalog and
+        saves it as a new version (saved before any replay, so it records
+        exactly the catalog it was fitted on), and the others find that
+        version current and memory-map it instead of fitting their own.
+        """
+        with build_lock(self._artifact_root):
+            artifact_dir = current_artifact_dir(self._artifact_root)
+            conn = sqlite3.connect(DB_PATH)
+            try:
+                catalog_version = read_catalog_version(conn)
+            finally:
+                conn.close()
+            if artifact_dir and artifact_catalog_version(artifact_dir) == catalog_version:
+                return Recommender(artifact_dir=artifact_dir)
+            fresh = Recommender()
+            try:
+                save_artifacts(fresh, self._artifact_root)
+            except Exception as e:
+                print(f"Could not save the refitted model as artifacts: {e}")
+            return fresh
+
+    def _refit(self):
+        try:
+            fresh = self._fit_shared() if self._artifact_root else Recommender()
+            if self.collaborative is not None:
+                # Row positions change with a refit, so the co-occurrence model is rebuilt against the new ones
+                fresh.enable_collaborative()
+        except Exception as e:
+            print(f"Background refit failed: {e}")
+            with self._lock:
+                self._refit_log = None
+            return
+        with self._lock, self.profiles.lock:
+            pending = self._refit_log
+            self._refit_log = None
+            for name, value in vars(fresh).items():
+                if name not in ('_lock', '_refit_log', 'profiles', '_profiles_generation', '_artifact_root'):
+                    setattr(self, name, value)
+            # Cached profiles refer to the old row positions; they are rebuilt from the table on next use
+            self.profiles.clear()
+            self._profiles_generation += 1
+            self._replaying = True
+            try:
+                for operation, payload in pending:
+                    getattr(self, operation)(payload)
+            finally:
+                self._replaying = False
+        print("Background refit complete.")
+
+    @timed('llm_search_terms')
     def _get_llm_search_terms(self, product_name):
         """
         "Head" Strategy: Use LLM to brainstorm complementary products.
@@ -81,92 +599,135 @@ Output: cushion,rug,lamp,table,ottoman
 ---
 """
         try:
-            chat_completion = groq_client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model="llama-3.1-8b-instant",
-                temperature=0.2, # Low temperature for factual, predictable output
-            )
-            terms = chat_completion.choices[0].message.content.strip().lower().split(',')
+            # Low temperature for factual, predictable output
+            terms = cached_completion(prompt, temperature=0.2).lower().split(',')
             print(f"LLM suggested terms: {terms}")
             return [term.strip() for term in terms]
         except Exception as e:
             print(f"LLM query expansion failed: {e}")
+            record_degradation('llm_search_terms', e) # Ranked on content similarity alone
             return []
         
-        # Add source_category as an argument
-    def _find_products_by_keyword(self, keyword, exclude_ids, source_category):
+    def _keyword_rows(self, keyword):
         """
-        Search for products containing a keyword in their name or description.
+        Returns the sorted row positions whose text matches the keyword (or its
+        singular form) as a whole word, case-insensitively.
         """
         # Convert keyword to singular to broaden the search
         singular_keyword = p.singular_noun(keyword) or keyword
-        
-        # --- THIS IS THE LINE THAT WAS MISSING ---
         search_regex = r'\b({}|{})\b'.format(singular_keyword, keyword)
-        
-        # Search in the 'soup' column for efficiency
-        matches = self.df[
-            self.df['soup'].str.contains(search_regex, case=False, na=False) &
-            ~self.df['product_id'].isin(exclude_ids)
-        ]
-        
+
+        rows = []
+        for term in {singular_keyword.lower(), keyword.lower()}:
+            tokens = re.findall(TOKEN_PATTERN, term)
+            if not tokens or REGEX_METACHARS.intersection(term):
+                # Not a plain word or phrase, so the index can't narrow it down
+                return self._regex_rows(search_regex, np.arange(len(self.df), dtype=np.int32))
+            if re.fullmatch(TOKEN_PATTERN, term):
+                rows.append(self.token_index.get(term, np.empty(0, dtype=np.int32)))
+            else:
+                # Phrase: rows holding every token are candidates, the regex confirms the match
+                candidates = reduce(np.intersect1d, (self.token_index.get(t, np.empty(0, dtype=np.int32)) for t in tokens))
+                rows.append(self._regex_rows(search_regex, candidates))
+        return reduce(np.union1d, rows)
+
+    def _regex_rows(self, search_regex, candidates):
+        soup = self._soup(candidates)
+        return candidates[soup.str.contains(search_regex, case=False, na=False).to_numpy()]
+
+    def _find_products_by_keyword(self, keyword, excluded, source_category_code):
+        """
+        Search for products containing a keyword in their name or description.
+        excluded is a boolean mask over product_id codes; returns up to two row positions.
+        """
+        rows = self._keyword_rows(keyword)
+        rows = rows[~excluded[self._codes['product_id'][rows]] & ~self.deleted[rows]]
+
         # Prioritize matches from the same category
-        same_category_matches = matches[matches['category'] == source_category]
-        if not same_category_matches.empty:
-            return same_category_matches.head(2)
-            
-        return matches.head(2) # Fallback to any category
-        
-        
+        same_category_rows = rows[self._codes['category'][rows] == source_category_code]
+        if len(same_category_rows):
+            return same_category_rows[:2]
 
-    def get_recommendations(self, product_id: str, num_recs: int = 5):
+        return rows[:2] # Fallback to any category
+
+    def get_recommendations(self, product_id: str, num_recs: int = 5, use_llm: bool = True):
         """
-        Hybrid recommendation function.
+        Hybrid recommendation function. With use_llm=False only the content-based
+        "tail" strategy runs, which makes the result a pure function of the catalog.
+        The search terms are requested in the caller's context, so its latency
+        budget and degradations apply; concurrent calls for the same product
+        still share one provider call through cached_completion.
         """
-        if product_id not in self.indices:
-            return []
+        with self._lock:
+            if product_id not in self.indices:
+                return []
+            product_name = self.df.iloc[self.indices[product_id]]['name']
 
         # --- 1. "Head" Strategy: LLM-powered complementary recommendations ---
-        source_product = self.df.iloc[self.indices[product_id]]
-        product_name = source_product['name']
-        
-        complementary_recs_df = pd.DataFrame()
-        suggested_terms = self._get_llm_search_terms(product_name)
-        
-        recommended_ids = {product_id} # Set to keep track of already recommended IDs
-        
-        if suggested_terms:
-            for term in suggested_terms:
-                if len(complementary_recs_df) >= num_recs:
+        # The LLM call runs outside the lock; the ranking below is fast and reads a consistent model
+        suggested_terms = self._get_llm_search_terms(product_name) if use_llm else []
+        with self._lock:
+            if product_id not in self.indices:
+                return []
+            return self._rank(product_id, suggested_terms, num_recs)
+
+    def _tail_candidates(self, idx):
+        """
+        Returns the "tail" candidates for row idx, best first: the content
+        neighbors, blended with co-occurrence scores when that model is enabled.
+        """
+        content_ids = self.neighbor_ids[idx]
+        if self.collaborative is None or CF_BLEND_WEIGHT <= 0:
+            return content_ids
+        cf_ids, cf_scores = self.collaborative.neighbors(idx)
+        live = (cf_ids < len(self.df)) & (cf_scores > 0)
+        cf_ids, cf_scores = cf_ids[live], cf_scores[live]
+        if len(cf_ids) == 0:
+            return content_ids
+
+        candidates = np.concatenate([content_ids, cf_ids[~np.isin(cf_ids, content_ids)]])
+        content = np.zeros(len(candidates), dtype=np.float32)
+        content[:len(content_ids)] = np.maximum(self.neighbor_scores[idx], 0)
+        cf = np.zeros(len(candidates), dtype=np.float32)
+        order = np.argsort(cf_ids)
+        found = np.searchsorted(cf_ids, candidates, sorter=order)
+        found = np.minimum(found, len(cf_ids) - 1)
+        matched = cf_ids[order[found]] == candidates
+        cf[matched] = cf_scores[order[found[matched]]] / cf_scores.max()
+
+        blended = (1 - CF_BLEND_WEIGHT) * content + CF_BLEND_WEIGHT * cf
+        # A stable sort keeps the content order wherever the blended scores tie
+        return candidates[np.argsort(-blended, kind='stable')]
+
+    def _rank(self, product_id, suggested_terms, num_recs):
+        idx = self.indices[product_id]
+        id_codes, name_codes = self._codes['product_id'], self._codes['name']
+        recommended_rows = []
+        # Product ids already recommended (or the source itself), as a mask over id codes
+        excluded = np.zeros(len(self._vocab['product_id']), dtype=bool)
+        excluded[id_codes[idx]] = True
+
+        with timer('keyword_match'):
+            for term in suggested_terms or []:
+                if len(recommended_rows) >= num_recs:
                     break
-                # + NEW CODE (Correct)
-                found_products = self._find_products_by_keyword(term, recommended_ids, source_product['category'])
-                if not found_products.empty:
-                    complementary_recs_df = pd.concat([complementary_recs_df, found_products])
-                    recommended_ids.update(found_products['product_id'].tolist())
+                found_rows = self._find_products_by_keyword(term, excluded, self._codes['category'][idx])
+                recommended_rows.extend(found_rows.tolist())
+                excluded[id_codes[found_rows]] = True
 
         # --- 2. "Tail" Strategy: Improved content-based recommendations ---
-        # Get a larger list of similar items first
-        idx = self.indices[product_id]
-        sim_scores = list(enumerate(self.cosine_sim[idx]))
-        sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
-        
-        similar_recs_df = pd.DataFrame()
-        # Iterate through similar items and add them if they are not duplicates
-        for i, score in sim_scores[1:]: # Skip the first item (itself)
-            if len(similar_recs_df) + len(complementary_recs_df) >= num_recs:
-                break
-            
-            rec_product = self.df.iloc[i]
-            # CRITICAL FIX: Check if the name is too similar to the source product
-            # and if the ID hasn't already been recommended
-            if rec_product['name'] != product_name and rec_product['product_id'] not in recommended_ids:
-                # Need to convert the Series to a DataFrame to concat
-                similar_recs_df = pd.concat([similar_recs_df, rec_product.to_frame().T])
-                recommended_ids.add(rec_product['product_id'])
+        with timer('similarity_ranking'):
+            needed = num_recs - len(recommended_rows)
+            if needed > 0:
+                candidates = np.asarray(self._tail_candidates(idx))
+                # Skip deleted rows, products named like the source, and ids already recommended
+                candidates = candidates[~self.deleted[candidates] & (name_codes[candidates] != name_codes[idx])]
+                candidates = candidates[~excluded[id_codes[candidates]]]
+                # An id can sit on several rows; keep only its best-ranked one
+                _, first = np.unique(id_codes[candidates], return_index=True)
+                recommended_rows.extend(candidates[np.sort(first)][:needed].tolist())
 
         # --- 3. Combine and Return ---
-        final_recs_df = pd.concat([complementary_recs_df, similar_recs_df]).head(num_recs)
-        
-        print(f"Generated {len(final_recs_df)} recommendations.")
-        return final_recs_df['product_id'].tolist()
\ No newline at end of file
+        recommended_ids = self.df['product_id'].to_numpy()[recommended_rows[:num_recs]].tolist()
+        print(f"Generated {len(recommended_ids)} recommendations.")
+        return recommended_ids
@@ -1,3 +1,5 @@
+import json
+
 import streamlit as st
 import requests
 import pandas as pd
@@ -11,6 +13,7 @@ st.set_page_config(
 
 # --- API Configuration ---
 API_URL = "http://127.0.0.1:8000/recommendations/{user_id}"
+STREAM_URL = API_URL + "/stream"
 
 # --- UI Components ---
 st.title("🛍️ E-commerce Product Recommender")
@@ -29,43 +32,60 @@ user_id = st.sidebar.selectbox(
 
 if st.sidebar.button("Get Recommendations"):
     # --- API Call ---
+    # The stream endpoint sends the products first and fills in summaries and
+    # explanations as the LLM finishes each one, so render them as they arrive.
     try:
-        response = requests.get(API_URL.format(user_id=user_id))
+        response = requests.get(STREAM_URL.format(user_id=user_id), stream=True)
         response.raise_for_status()
-        data = response.json()
 
-        # --- Display Results ---
-        st.header(f"Recommendations for User: `{data['user_id']}`")
+        placeholders = {}
+        for line in response.iter_lines():
+            if not line:
+                continue
+            event = json.loads(line)
+
+            if event['type'] == 'source':
+                # --- Display Results ---
+                st.header(f"Recommendations for User: `{event['user_id']}`")
+
+                # --- Source Product ---
+                st.subheader("Based on your recent activity on:")
+                source_product = event['source_product']
+                with st.container():
+                    st.markdown(f"**{source_product['name']}**")
+                    st.markdown(f"**Category:** {source_product['category']}")
+                    placeholders['source'] = st.empty()
+                    placeholders['source'].info(f"*{source_product['description'][:200]}...*")
+
+                st.divider()
 
-        # --- Source Product ---
-        st.subheader("Based on your recent activity on:")
-        source_product = data['source_product']
+            elif event['type'] == 'recommendations':
+                # --- Recommendations Section ---
+                st.subheader("Here are some products you might like:")
 
-        # FIXED: `st.container()` needs parentheses
-        with st.container():
-            st.markdown(f"**{source_product['name']}**")
-            st.markdown(f"**Category:** {source_product['category']}")
-            st.info(f"*{source_product['description'][:200]}...*")
+                # Create 3 columns for layout
+                cols = st.columns(3)
 
-        st.divider()
+                for i, product in enumerate(event['recommendations'][:3]):
+                    with cols[i]:
+                        st.markdown(f"**{product['name']}**")
+                        placeholders[('explanation', i)] = st.empty()
+                        placeholders[('explanation', i)].caption("Writing an explanation...")
+                        with st.expander("See product details"):
+                            st.write(f"**Category:** {product['category']}")
+                            placeholders[('summary', i)] = st.empty()
+                            placeholders[('summary', i)].caption("Summarizing...")
 
-        # --- Recommendations Section ---
-        st.subheader("Here are some products you might like:")
-        recommendations = data['recommendations']
+            elif event['type'] == 'source_summary':
+                placeholders['source'].info(f"*{event['description']}*")
 
-        # Create 3 columns for layout
-        cols = st.columns(3)
+            elif event['type'] == 'summary' and ('summary', event['index']) in placeholders:
+                placeholders[('summary', event['index'])].write(event['description'])
 
-        for i, rec in enumerate(recommendations[:3]):
-            with cols[i]:
-                product = rec['recommended_product']
-                st.markdown(f"**{product['name']}**")
-                st.success(f"**Why you'll like it:** {rec['explanation']}")
-                with st.expander("See product details"):
-                    st.write(f"**Category:** {product['category']}")
-                    st.write(product['description'])
+            elif event['type'] == 'explanation' and ('explanation', event['index']) in placeholders:
+                placeholders[('explanation', event['index'])].success(f"**Why you'll like it:** {event['explanation']}")
 
     except requests.exceptions.RequestException as e:
         st.error(f"Could not connect to the API. Please ensure the FastAPI server is running.\n\nError: {e}")
-    except KeyError:
+    except (KeyError, ValueError):
         st.error("Received an unexpected data format from the API.")
@@ -0,0 +1,6 @@
+"""
+Reproducible benchmarks for the recommender: a synthetic catalog generator,
+a local fake LLM provider and timing runs for the main code paths.
+
+Run with `python -m benchmarks.run --scale 10k`.
+"""
@@ -0,0 +1,49 @@
+import json
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+from .synthetic import NOUNS
+
+
+class FakeLLMClient:
+    """
+    Local stand-in for the Groq client with configurable latency and jitter.
+    It exposes the same `client.chat.completions.create(...)` surface and
+    returns canned but prompt-appropriate text, so every code path runs
+    without network access.
+    """
+
+    def __init__(self, latency=0.2, jitter=0.05, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, messages, model, **params):
+        prompt = messages[-1]['content']
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self._rng.gauss(self.latency, self.jitter))
+            terms = self._rng.sample(NOUNS, 6)
+        time.sleep(delay)
+
+        if '"items"' in prompt:
+            ids = sorted({int(i) for i in re.findall(r'^\s*Item (\d+)', prompt, flags=re.MULTILINE)})
+            content = json.dumps({"items": [{
+                "id": i,
+                "explanation": "Because you viewed a similar item, we think this pairs well with it.",
+                "summary": "A comfortable cotton everyday essential with a clean, modern design.",
+            } for i in ids]})
+        elif 'related product search terms' in prompt:
+            content = ','.join(terms)
+        elif 'Summary' in prompt:
+            content = "A comfortable cotton everyday essential with a clean, modern design."
+        else:
+            content = "Because you viewed a similar item, we think this pairs well with it."
+        usage = SimpleNamespace(prompt_tokens=len(prompt) // 4, completion_tokens=len(content) // 4)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
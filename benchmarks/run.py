@@ -0,0 +1,178 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from .synthetic import NOUNS, SCALES, generate_database
+from .fake_llm import FakeLLMClient
+
+# --- Configuration ---
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+
+def _percentiles(samples):
+    samples = np.asarray(samples) * 1000
+    return {
+        'count': int(len(samples)),
+        'p50_ms': float(np.percentile(samples, 50)),
+        'p90_ms': float(np.percentile(samples, 90)),
+        'p99_ms': float(np.percentile(samples, 99)),
+        'mean_ms': float(samples.mean()),
+    }
+
+
+def _peak_rss_mb():
+    # ru_maxrss is reported in KB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def bench_init(recommender_module):
+    rss_before = _peak_rss_mb()
+    start = time.perf_counter()
+    recommender = recommender_module.Recommender()
+    elapsed = time.perf_counter() - start
+    return recommender, {
+        'seconds': elapsed,
+        'peak_rss_mb': _peak_rss_mb(),
+        'peak_rss_before_mb': rss_before,
+    }
+
+
+def bench_get_recommendations(recommender, product_ids, fake_llm):
+    # The LLM is made instant here so the numbers reflect the ranking work itself
+    latency, jitter = fake_llm.latency, fake_llm.jitter
+    fake_llm.latency, fake_llm.jitter = 0.0, 0.0
+    try:
+        samples = [_timed(recommender.get_recommendations, pid, num_recs=5) for pid in product_ids]
+    finally:
+        fake_llm.latency, fake_llm.jitter = latency, jitter
+    return _percentiles(samples)
+
+
+def bench_keyword_search(recommender, keywords, rng):
+    category_codes = list(recommender._vocab['category'].values())
+    samples = []
+    for keyword in keywords:
+        excluded = np.zeros(len(recommender._vocab['product_id']), dtype=bool)
+        excluded[rng.randrange(len(excluded))] = True
+        samples.append(_timed(recommender._find_products_by_keyword, keyword, excluded, rng.choice(category_codes)))
+    return _percentiles(samples)
+
+
+async def bench_endpoint(app_module, user_ids, concurrency):
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, statuses = [], {}
+    transport = httpx.ASGITransport(app=app_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=None) as client:
+        async def one(user_id):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(f'/recommendations/{user_id}')
+                latencies.append(time.perf_counter() - start)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*[one(user_id) for user_id in user_ids])
+        elapsed = time.perf_counter() - start
+    result = _percentiles(latencies)
+    result.update({
+        'concurrency': concurrency,
+        'seconds': elapsed,
+        'requests_per_second': len(user_ids) / elapsed,
+        'status_codes': {str(code): count for code, count in statuses.items()},
+    })
+    return result
+
+
+def run(scale, queries, requests, concurrency, llm_latency, llm_jitter, use_cache, seed, workdir):
+    num_products = SCALES[scale]
+    db_path = os.path.join(workdir, f'bench_{scale}.sqlite3')
+    print(f"Generating synthetic {scale} catalog at {db_path}...")
+    start = time.perf_counter()
+    num_users = generate_database(db_path, num_products, seed=seed)
+    generate_seconds = time.perf_counter() - start
+
+    # Point every module at the synthetic database and a throwaway LLM cache before importing the API
+    os.environ['LLM_CACHE_DB_PATH'] = os.path.join(workdir, 'llm_cache.sqlite3')
+    from api import llm_handler, recommender as recommender_module, db, main as app_module
+
+    fake_llm = FakeLLMClient(latency=llm_latency, jitter=llm_jitter, seed=seed)
+    llm_handler.client = fake_llm
+    recommender_module.DB_PATH = db.DB_PATH = db_path
+    if not use_cache:
+        llm_handler.cache.memory_max_entries = 0
+        llm_handler.cache._disk_enabled = False
+
+    rng = random.Random(seed)
+    results = {'generate_catalog': {'seconds': generate_seconds}}
+
+    recommender, results['recommender_init'] = bench_init(recommender_module)
+    product_ids = [rng.choice(recommender.df['product_id']) for _ in range(queries)]
+    results['get_recommendations'] = bench_get_recommendations(recommender, product_ids, fake_llm)
+    # Mix singular and plural terms, like the LLM produces
+    keywords = [rng.choice(NOUNS) for _ in range(queries)]
+    keywords = [recommender_module.p.plural(keyword) if rng.random() < 0.5 else keyword for keyword in keywords]
+    results['find_products_by_keyword'] = bench_keyword_search(recommender, keywords, rng)
+
+    app_module.recommender_engine = recommender
+    db.init_db()
+    user_ids = [f"user{rng.randrange(num_users)}" for _ in range(requests)]
+    llm_calls_before = fake_llm.calls
+    results['endpoint'] = asyncio.run(bench_endpoint(app_module, user_ids, concurrency))
+    results['endpoint']['llm_calls'] = fake_llm.calls - llm_calls_before
+    results['llm_cache'] = llm_handler.cache.get_stats()
+
+    return {
+        'scale': scale,
+        'num_products': num_products,
+        'num_users': num_users,
+        'config': {
+            'queries': queries, 'requests': requests, 'concurrency': concurrency,
+            'llm_latency': llm_latency, 'llm_jitter': llm_jitter, 'use_cache': use_cache, 'seed': seed,
+        },
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'timestamp': time.time(),
+        'results': results,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the recommender on a synthetic catalog with a fake LLM.")
+    parser.add_argument('--scale', choices=list(SCALES), default='10k')
+    parser.add_argument('--queries', type=int, default=200, help="Samples for the in-process benchmarks.")
+    parser.add_argument('--requests', type=int, default=100, help="Requests for the endpoint benchmark.")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--llm-latency', type=float, default=0.2, help="Mean fake LLM latency in seconds.")
+    parser.add_argument('--llm-jitter', type=float, default=0.05, help="Std-dev of the fake LLM latency.")
+    parser.add_argument('--with-cache', action='store_true', help="Keep the LLM cache enabled.")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="Where to write the JSON results (default: benchmarks/results/<scale>-<time>.json).")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='recommender-bench-') as workdir:
+        report = run(args.scale, args.queries, args.requests, args.concurrency,
+                     args.llm_latency, args.llm_jitter, args.with_cache, args.seed, workdir)
+
+    output = args.output or os.path.join(DEFAULT_OUTPUT_DIR, f"{args.scale}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report['results'], indent=2))
+    print(f"Results written to {output}")
@@ -0,0 +1,69 @@
+import os
+import random
+import sqlite3
+
+# --- Configuration ---
+SCALES = {'1k': 1_000, '10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+INTERACTIONS_PER_PRODUCT = 2
+USERS_PER_PRODUCT = 0.2
+INSERT_BATCH_SIZE = 50_000
+
+CATEGORIES = ["Clothing", "Footwear", "Home Furnishing", "Watches", "Bags, Wallets & Belts", "Sports & Fitness"]
+ADJECTIVES = ["solid", "printed", "casual", "slim", "cotton", "leather", "striped", "classic", "sporty", "woven"]
+AUDIENCES = ["women's", "men's", "unisex", "kids'"]
+NOUNS = [
+    "shirt", "jersey", "legging", "bra", "helmet", "bottle", "belt", "watch", "shoe", "briefcase",
+    "keychain", "cushion", "rug", "lamp", "table", "ottoman", "wallet", "sofa", "short", "jacket",
+    "sock", "cap", "backpack", "sandal", "kurta", "saree", "curtain", "mug", "glove", "scarf",
+]
+FILLER = ["soft", "durable", "fabric", "comfortable", "premium", "quality", "design", "daily", "wear",
+          "stylish", "lightweight", "genuine", "perfect", "gift", "pack", "of", "with", "for", "and"]
+
+
+def _product(rng, i):
+    noun = rng.choice(NOUNS)
+    name = f"{rng.choice(ADJECTIVES).title()} {rng.choice(AUDIENCES).title()} {noun.title()}"
+    words = [rng.choice(FILLER + NOUNS + ADJECTIVES) for _ in range(rng.randint(20, 60))]
+    description = f"{name}. " + ' '.join(words)
+    return f"syn{i:08d}", name, rng.choice(CATEGORIES), description
+
+
+def generate_database(path, num_products, seed=42):
+    """
+    Writes a synthetic products + user_interactions SQLite database with the
+    same schema seed_data.py produces. The same seed always yields the same data.
+    """
+    rng = random.Random(seed)
+    if os.path.exists(path):
+        os.remove(path)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode=OFF')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute('CREATE TABLE products (product_id TEXT, name TEXT, category TEXT, description TEXT)')
+    conn.execute('''
+    CREATE TABLE user_interactions (
+        interaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        product_id TEXT NOT NULL,
+        event_type TEXT NOT NULL
+    )''')
+
+    for start in range(0, num_products, INSERT_BATCH_SIZE):
+        end = min(start + INSERT_BATCH_SIZE, num_products)
+        conn.executemany('INSERT INTO products VALUES (?, ?, ?, ?)', (_product(rng, i) for i in range(start, end)))
+
+    num_users = max(1, int(num_products * USERS_PER_PRODUCT))
+    num_interactions = num_products * INTERACTIONS_PER_PRODUCT
+    for start in range(0, num_interactions, INSERT_BATCH_SIZE):
+        end = min(start + INSERT_BATCH_SIZE, num_interactions)
+        conn.executemany(
+            'INSERT INTO user_interactions (user_id, product_id, event_type) VALUES (?, ?, ?)',
+            ((f"user{rng.randrange(num_users)}", f"syn{rng.randrange(num_products):08d}",
+              'purchase' if rng.random() < 0.1 else 'view') for _ in range(start, end))
+        )
+    conn.execute('CREATE INDEX idx_user_interactions_user ON user_interactions (user_id, interaction_id)')
+    conn.commit()
+    conn.close()
+    return num_users
@@ -0,0 +1,23 @@
+import argparse
+
+from api.recommender import Recommender
+from api.artifacts import ARTIFACTS_ROOT, build_lock, save_artifacts
+
+
+def build_artifacts(root=ARTIFACTS_ROOT):
+    """
+    Fits the recommender from the database and writes a new artifact version.
+    The API picks up the version CURRENT points at on its next start. Older
+    versions beyond the previous one are pruned.
+    """
+    with build_lock(root):
+        print("Building recommender artifacts...")
+        recommender = Recommender()
+        return save_artifacts(recommender, root)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build memory-mappable recommender artifacts.")
+    parser.add_argument('--root', default=ARTIFACTS_ROOT, help="Directory that holds artifact versions.")
+    args = parser.parse_args()
+    build_artifacts(args.root)
@@ -0,0 +1,100 @@
+import argparse
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from api.budget import offline_calls
+from api.artifacts import artifact_catalog_version, current_artifact_dir
+from api.db import read_catalog_version
+from build_artifacts import build_artifacts
+
+# --- Configuration ---
+DB_PATH = 'data/db.sqlite3'
+PRECOMPUTED_TABLE_NAME = 'precomputed_recommendations'
+NUM_RECS = 5
+SHARD_SIZE = 1000 # Products handled per worker task
+MAX_WORKERS = os.cpu_count() or 1
+
+_recommender = None # Per-process model, loaded once by _init_worker
+
+
+def _init_worker(artifact_dir):
+    global _recommender
+    from api.recommender import Recommender
+    # Every worker memory-maps the same artifact files, so they share pages instead of copying the model
+    _recommender = Recommender(artifact_dir=artifact_dir)
+
+
+def _compute_shard(args):
+    product_ids, num_recs, use_llm = args
+    results = []
+    # With --with-llm the search-term calls are batch work: no serving timeout cap or circuit breaker
+    with offline_calls():
+        for product_id in product_ids:
+            # No row for products the model can't rank (e.g. added after it was built); they are served live
+            recommended_ids = _recommender.get_recommendations(product_id, num_recs=num_recs, use_llm=use_llm)
+            if recommended_ids:
+                results.append((product_id, ','.join(recommended_ids)))
+    return results
+
+
+def precompute_recommendations(num_recs=NUM_RECS, shard_size=SHARD_SIZE, max_workers=MAX_WORKERS,
+                               use_llm=False, refresh=False):
+    """
+    Computes the recommendation list of every product with a process pool over
+    product shards and stores it in a lookup table keyed by product_id. Shards
+    are committed as they finish, so an interrupted run resumes where it stopped.
+    Artifacts built from an older catalog are rebuilt first.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    artifact_dir = current_artifact_dir()
+    if artifact_dir is None or artifact_catalog_version(artifact_dir) != read_catalog_version(conn):
+        print("No artifacts for the current catalog, building them first.")
+        artifact_dir = build_artifacts()
+
+    conn.execute(f'''
+    CREATE TABLE IF NOT EXISTS {PRECOMPUTED_TABLE_NAME} (
+        product_id TEXT PRIMARY KEY,
+        recommended_ids TEXT NOT NULL,
+        computed_at REAL NOT NULL
+    ) WITHOUT ROWID;
+    ''')
+    if refresh:
+        conn.execute(f'DELETE FROM {PRECOMPUTED_TABLE_NAME}')
+    conn.commit()
+
+    done_ids = {row[0] for row in conn.execute(f'SELECT product_id FROM {PRECOMPUTED_TABLE_NAME}')}
+    product_ids = [row[0] for row in conn.execute('SELECT DISTINCT product_id FROM products') if row[0] not in done_ids]
+    shards = [(product_ids[i:i + shard_size], num_recs, use_llm) for i in range(0, len(product_ids), shard_size)]
+    print(f"Precomputing recommendations for {len(product_ids)} products in {len(shards)} shards "
+          f"({len(done_ids)} already done).")
+
+    done, stored, start = 0, 0, time.time()
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(artifact_dir,)) as executor:
+        for shard, results in zip(shards, executor.map(_compute_shard, shards)):
+            now = time.time()
+            conn.executemany(
+                f'INSERT OR REPLACE INTO {PRECOMPUTED_TABLE_NAME} (product_id, recommended_ids, computed_at) VALUES (?, ?, ?)',
+                [(product_id, recommended_ids, now) for product_id, recommended_ids in results]
+            )
+            conn.commit()
+            done += len(shard[0])
+            stored += len(results)
+            print(f"Computed {done}/{len(product_ids)} products, stored {stored} "
+                  f"({done / max(now - start, 1e-9):.0f}/s).")
+
+    conn.close()
+    print("Precomputation complete.")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Precompute the recommendation list of every product.")
+    parser.add_argument('--num-recs', type=int, default=NUM_RECS)
+    parser.add_argument('--shard-size', type=int, default=SHARD_SIZE)
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS)
+    parser.add_argument('--with-llm', action='store_true',
+                        help="Include the LLM-driven complementary picks (one LLM call per product, cached).")
+    parser.add_argument('--refresh', action='store_true', help="Recompute products that already have a row.")
+    args = parser.parse_args()
+    precompute_recommendations(args.num_recs, args.shard_size, args.workers, args.with_llm, args.refresh)
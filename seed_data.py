@@ -1,12 +1,58 @@
+import argparse
 import pandas as pd
 import sqlite3
 import json
+import os
+import time
+import pyarrow as pa
+import pyarrow.compute as pc
 
 # --- Configuration ---
 CSV_PATH = 'data/products.csv'
 DB_PATH = 'data/db.sqlite3'
 PRODUCTS_TABLE_NAME = 'products'
 INTERACTIONS_TABLE_NAME = 'user_interactions'
+CATALOG_VERSION_TABLE_NAME = 'catalog_version' # Bumped on every catalog write, so stale model artifacts are detected
+STAGING_TABLE_NAME = 'products_staging' # Holds the raw streamed rows until they are merged into products
+CHUNK_SIZE = 50_000 # CSV rows parsed and written per transaction in streaming mode
+CSV_COLUMNS = {
+    'uniq_id': 'product_id',
+    'product_name': 'name',
+    'product_category_tree': 'category',
+    'description': 'description'
+}
+# A list holding exactly one string with no escapes or control characters (which json.loads would
+# reject), and that string's text before its first ">>". Anything else goes through json.loads.
+JSON_WHITESPACE = r'[ \t\n\r]*'
+WELL_FORMED_CATEGORY_PATTERN = (
+    rf'^{JSON_WHITESPACE}\[{JSON_WHITESPACE}"(?:[^"\\>\x00-\x1f]|>[^"\\>\x00-\x1f])*(?:>>[^"\\\x00-\x1f]*)?"'
+    rf'{JSON_WHITESPACE}\]{JSON_WHITESPACE}$'
+)
+MAIN_CATEGORY_PATTERN = rf'^{JSON_WHITESPACE}\[{JSON_WHITESPACE}"(?P<main>(?:[^"\\>]|>[^"\\>])*)'
+
+# Clean the 'category' column to get only the main category
+# E.g., "Home & Kitchen >> Kitchen & Dining >> ..." -> "Home & Kitchen"
+def clean_category(raw_cat):
+    try:
+        # The data is a string representation of a list
+        first_item = json.loads(raw_cat)[0]
+        return first_item.split('>>')[0].strip()
+    except (json.JSONDecodeError, IndexError, TypeError):
+        return "Uncategorized" # Handle malformed or empty data
+
+def clean_categories(raw_cats: pd.Series) -> pd.Series:
+    """
+    Vectorized clean_category: Arrow's regex kernels pull the main category out
+    of every single-entry category list at once, and every other row (several
+    entries, escapes, control characters, malformed JSON) goes through
+    json.loads, so the result is identical to clean_category.
+    """
+    values = pa.array(raw_cats, type=pa.string(), from_pandas=True)
+    complete = pc.fill_null(pc.match_substring_regex(values, WELL_FORMED_CATEGORY_PATTERN), False).to_numpy(zero_copy_only=False)
+    main = pc.utf8_trim_whitespace(pc.struct_field(pc.extract_regex(values, MAIN_CATEGORY_PATTERN), 'main'))
+    cleaned = pd.Series(main.to_numpy(zero_copy_only=False), index=raw_cats.index, dtype=object)
+    cleaned[~complete] = raw_cats[~complete].map(clean_category)
+    return cleaned
 
 # --- Main Seeding Function ---
 def seed_database():
@@ -23,25 +69,10 @@ def seed_database():
 
         # Select and rename columns to match our desired schema
         # Based on your screenshot, these are the best columns to use
-        df_selected = df[['uniq_id', 'product_name', 'product_category_tree', 'description']].copy()
-        df_selected.rename(columns={
-            'uniq_id': 'product_id',
-            'product_name': 'name',
-            'product_category_tree': 'category',
-            'description': 'description'
-        }, inplace=True)
-
-        # Clean the 'category' column to get only the main category
-        # E.g., "Home & Kitchen >> Kitchen & Dining >> ..." -> "Home & Kitchen"
-        def clean_category(raw_cat):
-            try:
-                # The data is a string representation of a list
-                first_item = json.loads(raw_cat)[0]
-                return first_item.split('>>')[0].strip()
-            except (json.JSONDecodeError, IndexError):
-                return "Uncategorized" # Handle malformed or empty data
-
-        df_selected['category'] = df_selected['category'].apply(clean_category)
+        df_selected = df[list(CSV_COLUMNS)].copy()
+        df_selected.rename(columns=CSV_COLUMNS, inplace=True)
+
+        df_selected['category'] = clean_categories(df_selected['category'])
         
         # Drop rows where essential information might be missing
         df_selected.dropna(subset=['product_id', 'name'], inplace=True)
@@ -63,9 +94,31 @@ def seed_database():
     # `if_exists='replace'` will drop the table first if it exists, which is
     # useful if you need to re-run the script.
     df_selected.to_sql(PRODUCTS_TABLE_NAME, conn, if_exists='replace', index=False)
+    bump_catalog_version(cursor)
     print(f"Successfully created and populated the '{PRODUCTS_TABLE_NAME}' table.")
 
     # 3. Create and Populate User Interactions Table
+    create_interactions_table(cursor)
+    insert_sample_interactions(cursor)
+    conn.commit()
+
+    # 4. Close the connection
+    conn.close()
+    print("Database seeding complete. The file 'data/db.sqlite3' is ready.")
+
+
+def bump_catalog_version(cursor):
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS {CATALOG_VERSION_TABLE_NAME} '
+        f'(id INTEGER PRIMARY KEY CHECK (id = 0), version INTEGER NOT NULL)'
+    )
+    cursor.execute(
+        f'INSERT INTO {CATALOG_VERSION_TABLE_NAME} (id, version) VALUES (0, 1) '
+        f'ON CONFLICT (id) DO UPDATE SET version = version + 1'
+    )
+
+
+def create_interactions_table(cursor):
     cursor.execute(f'''
     CREATE TABLE IF NOT EXISTS {INTERACTIONS_TABLE_NAME} (
         interaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -75,8 +128,12 @@ def seed_database():
         FOREIGN KEY (product_id) REFERENCES {PRODUCTS_TABLE_NAME} (product_id)
     );
     ''')
+    # The API looks up each user's latest interaction, so index it
+    cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{INTERACTIONS_TABLE_NAME}_user ON {INTERACTIONS_TABLE_NAME} (user_id, interaction_id);')
     print(f"Successfully created the '{INTERACTIONS_TABLE_NAME}' table.")
 
+
+def insert_sample_interactions(cursor):
     # Add some sample interaction data so we can test the API
     sample_interactions = [
         ('user123', 'c2d766ca982eca8304150849735ffef9', 'view'), # A "Solid" t-shirt
@@ -86,13 +143,112 @@ def seed_database():
     
     # We use `executemany` for efficiency
     cursor.executemany(f'INSERT INTO {INTERACTIONS_TABLE_NAME} (user_id, product_id, event_type) VALUES (?, ?, ?)', sample_interactions)
-    conn.commit()
     print(f"Inserted {len(sample_interactions)} sample user interactions.")
 
-    # 4. Close the connection
+
+# --- Streaming Seeding Function ---
+def stream_seed_database(csv_path=CSV_PATH, db_path=DB_PATH, chunk_size=CHUNK_SIZE):
+    """
+    Streams a catalog CSV of any size into the products table with flat memory:
+    the file is parsed chunk_size rows at a time and appended to an unindexed
+    staging table, then merged into products in one pass. Products already in
+    the table are replaced (upsert) instead of dropping the table, and when a
+    product_id appears more than once the last row wins.
+    """
+    print(f"Streaming {csv_path} into {db_path}...")
+    if not os.path.exists(csv_path):
+        print(f"Error: The file {csv_path} was not found.")
+        return
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    # Fast-load settings: no fsync per transaction. The page cache is capped and the
+    # merge's temporary sort spills to disk, so memory doesn't grow with the input.
+    # A crash mid-load can only lose the staging table, which is rebuilt on the next run.
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=OFF')
+    cursor.execute('PRAGMA temp_store=FILE')
+    cursor.execute('PRAGMA cache_size=-65536') # 64 MB
+
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {PRODUCTS_TABLE_NAME} (
+        product_id TEXT,
+        name TEXT,
+        category TEXT,
+        description TEXT
+    );
+    ''')
+    cursor.execute(f'DROP TABLE IF EXISTS {STAGING_TABLE_NAME}')
+    cursor.execute(f'CREATE TABLE {STAGING_TABLE_NAME} (product_id TEXT, name TEXT, category TEXT, description TEXT)')
+    conn.commit()
+
+    # 1. Stream the CSV into the staging table, one transaction per chunk
+    total_bytes = os.path.getsize(csv_path)
+    loaded, start = 0, time.perf_counter()
+    try:
+        with open(csv_path, 'rb') as f:
+            for chunk in pd.read_csv(f, usecols=list(CSV_COLUMNS), chunksize=chunk_size, dtype=str):
+                chunk = chunk.rename(columns=CSV_COLUMNS).dropna(subset=['product_id', 'name'])
+                chunk['category'] = clean_categories(chunk['category'].fillna(''))
+                chunk = chunk[['product_id', 'name', 'category', 'description']].astype(object)
+                with conn:
+                    conn.executemany(
+                        f'INSERT INTO {STAGING_TABLE_NAME} VALUES (?, ?, ?, ?)',
+                        chunk.where(chunk.notna(), None).itertuples(index=False, name=None)
+                    )
+                loaded += len(chunk)
+                elapsed = time.perf_counter() - start
+                print(f"  {loaded:,} rows | {f.tell() / total_bytes:.0%} of {total_bytes / 1e6:,.0f} MB "
+                      f"| {loaded / elapsed:,.0f} rows/s")
+    except ValueError as e:
+        # read_csv reports missing usecols as a ValueError
+        print(f"Error: A required column was not found in the CSV: {e}")
+        cursor.execute(f'DROP TABLE IF EXISTS {STAGING_TABLE_NAME}')
+        conn.close()
+        return
+
+    # 2. Merge into products: drop the rows being replaced, then insert the last version of each product
+    print("Merging staged rows into the products table...")
+    with conn:
+        has_rows = cursor.execute(f'SELECT 1 FROM {PRODUCTS_TABLE_NAME} LIMIT 1').fetchone() is not None
+        if has_rows:
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{PRODUCTS_TABLE_NAME}_product_id ON {PRODUCTS_TABLE_NAME} (product_id)')
+            replaced = cursor.execute(
+                f'DELETE FROM {PRODUCTS_TABLE_NAME} WHERE product_id IN (SELECT product_id FROM {STAGING_TABLE_NAME})'
+            ).rowcount
+        else:
+            replaced = 0
+        inserted = cursor.execute(f'''
+            INSERT INTO {PRODUCTS_TABLE_NAME} (product_id, name, category, description)
+            SELECT product_id, name, category, description FROM {STAGING_TABLE_NAME}
+            WHERE rowid IN (SELECT MAX(rowid) FROM {STAGING_TABLE_NAME} GROUP BY product_id)
+        ''').rowcount
+        cursor.execute(f'DROP TABLE {STAGING_TABLE_NAME}')
+        bump_catalog_version(cursor)
+
+    # 3. Build the indexes once the data is in place
+    cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{PRODUCTS_TABLE_NAME}_product_id ON {PRODUCTS_TABLE_NAME} (product_id)')
+    create_interactions_table(cursor)
+    if cursor.execute(f'SELECT 1 FROM {INTERACTIONS_TABLE_NAME} LIMIT 1').fetchone() is None:
+        insert_sample_interactions(cursor)
+    conn.commit()
+    cursor.execute('PRAGMA synchronous=NORMAL')
     conn.close()
-    print("Database seeding complete. The file 'data/db.sqlite3' is ready.")
+
+    elapsed = time.perf_counter() - start
+    print(f"Streamed {loaded:,} rows in {elapsed:.1f}s ({loaded / elapsed:,.0f} rows/s): "
+          f"{inserted:,} products written, {replaced:,} existing rows replaced.")
 
 
 if __name__ == '__main__':
-    seed_database()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Seed the SQLite database from the product catalog CSV.")
+    parser.add_argument('--stream', action='store_true',
+                        help="Stream the CSV in chunks and upsert into the existing products table (for large dumps).")
+    parser.add_argument('--csv', default=CSV_PATH, help="Catalog CSV to load in streaming mode.")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Rows per chunk in streaming mode.")
+    args = parser.parse_args()
+
+    if args.stream:
+        stream_seed_database(args.csv, DB_PATH, args.chunk_size)
+    else:
+        seed_database()
\ No newline at end of file
@@ -0,0 +1,92 @@
+import argparse
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from api.budget import offline_calls
+from api.llm_handler import client, generate_summary
+
+# --- Configuration ---
+DB_PATH = 'data/db.sqlite3'
+PRODUCTS_TABLE_NAME = 'products'
+SUMMARY_COLUMN = 'summary'
+BATCH_SIZE = 200 # Rows fetched and committed per checkpoint
+MAX_WORKERS = 8 # Concurrent LLM calls
+
+
+def ensure_summary_column(conn):
+    """Adds the summary column to the products table if it isn't there yet."""
+    columns = [row[1] for row in conn.execute(f'PRAGMA table_info({PRODUCTS_TABLE_NAME})')]
+    if SUMMARY_COLUMN not in columns:
+        conn.execute(f'ALTER TABLE {PRODUCTS_TABLE_NAME} ADD COLUMN {SUMMARY_COLUMN} TEXT')
+        conn.commit()
+        print(f"Added '{SUMMARY_COLUMN}' column to the '{PRODUCTS_TABLE_NAME}' table.")
+
+
+def _summarize_row(row):
+    rowid, name, description = row
+    try:
+        # Batch work: a longer per-call timeout and no circuit breaker, so a bad stretch can't fail every remaining row
+        with offline_calls():
+            return rowid, generate_summary(name or '', description or '')
+    except Exception as e:
+        print(f"Summarization failed for row {rowid}: {e}")
+        return rowid, None
+
+
+def summarize_products(batch_size=BATCH_SIZE, max_workers=MAX_WORKERS, refresh=False):
+    """
+    Streams through the products table and stores an LLM summary for every row
+    that doesn't have one yet. Each batch is committed as it finishes, so an
+    interrupted run picks up where it stopped; failed rows stay NULL and are
+    retried on the next run.
+    """
+    if not client:
+        print("Groq client is not configured, nothing to do.")
+        return
+
+    conn = sqlite3.connect(DB_PATH)
+    ensure_summary_column(conn)
+    if refresh:
+        conn.execute(f'UPDATE {PRODUCTS_TABLE_NAME} SET {SUMMARY_COLUMN} = NULL')
+        conn.commit()
+
+    pending = conn.execute(
+        f'SELECT COUNT(*) FROM {PRODUCTS_TABLE_NAME} WHERE {SUMMARY_COLUMN} IS NULL'
+    ).fetchone()[0]
+    print(f"{pending} products need a summary.")
+
+    done, failed, last_rowid = 0, 0, 0
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            # Keyset pagination keeps each query cheap and skips rows that failed earlier in this run
+            rows = conn.execute(
+                f'SELECT rowid, name, description FROM {PRODUCTS_TABLE_NAME} '
+                f'WHERE {SUMMARY_COLUMN} IS NULL AND rowid > ? ORDER BY rowid LIMIT ?',
+                (last_rowid, batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            last_rowid = rows[-1][0]
+
+            results = [(summary, rowid) for rowid, summary in executor.map(_summarize_row, rows) if summary]
+            conn.executemany(f'UPDATE {PRODUCTS_TABLE_NAME} SET {SUMMARY_COLUMN} = ? WHERE rowid = ?', results)
+            conn.commit()
+
+            done += len(results)
+            failed += len(rows) - len(results)
+            rate = done / max(time.time() - start, 1e-9)
+            print(f"Summarized {done}/{pending} products ({failed} failed, {rate:.1f}/s).")
+
+    conn.close()
+    print("Summary generation complete.")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Precompute LLM product summaries into the database.")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS)
+    parser.add_argument('--refresh', action='store_true', help="Regenerate summaries that already exist.")
+    args = parser.parse_args()
+    summarize_products(batch_size=args.batch_size, max_workers=args.workers, refresh=args.refresh)
@@ -0,0 +1,57 @@
+import random
+
+import numpy as np
+import pytest
+
+import api.recommender as recommender_module
+from benchmarks.synthetic import _product, generate_database
+
+
+@pytest.fixture
+def recommender(tmp_path, monkeypatch):
+    db_path = tmp_path / "db.sqlite3"
+    generate_database(str(db_path), 400)
+    monkeypatch.setattr(recommender_module, "DB_PATH", str(db_path))
+    # Keep the drift check from starting a background refit mid-test
+    monkeypatch.setattr(recommender_module, "REFIT_MIN_UPSERTED_TOKENS", 10**9)
+    return recommender_module.Recommender()
+
+
+def _apply_updates(recommender):
+    rng = random.Random(7)
+    new = [_product(rng, i) for i in range(400, 430)]
+    changed = [_product(rng, i) for i in range(0, 60, 3)]
+    recommender.upsert_products([
+        {"product_id": pid, "name": name, "category": category, "description": description}
+        for pid, name, category, description in new + changed
+    ])
+    recommender.delete_products([f"syn{i:08d}" for i in range(100, 140, 4)] + ["syn00000410"])
+
+
+def test_neighbors_match_brute_force_after_updates(recommender):
+    _apply_updates(recommender)
+
+    k = recommender.neighbor_ids.shape[1]
+    sims = (recommender.tfidf_matrix @ recommender.tfidf_matrix.T).toarray()
+    np.fill_diagonal(sims, -np.inf)
+    sims[:, recommender.deleted] = -np.inf
+    expected_scores = -np.sort(-sims, axis=1)[:, :k]
+
+    live = np.flatnonzero(~recommender.deleted)
+    np.testing.assert_allclose(recommender.neighbor_scores[live], expected_scores[live], atol=1e-5)
+    # The listed ids carry the scores they are listed with, and never a deleted product
+    listed = np.take_along_axis(sims, recommender.neighbor_ids.astype(np.int64), axis=1)
+    np.testing.assert_allclose(listed[live], recommender.neighbor_scores[live], atol=1e-5)
+    assert not recommender.deleted[recommender.neighbor_ids[live]].any()
+
+
+def test_token_index_matches_rebuild_after_updates(recommender):
+    _apply_updates(recommender)
+
+    live = np.flatnonzero(~recommender.deleted).astype(np.int32)
+    expected = recommender._positions_by_token(zip(live, recommender._soup(live)))
+    actual = {token: rows for token, rows in recommender.token_index.items() if len(rows)}
+    assert actual.keys() == expected.keys()
+    for token, rows in expected.items():
+        assert actual[token].dtype == np.int32
+        assert actual[token].tolist() == rows.tolist()
@@ -0,0 +1,71 @@
+import asyncio
+import sqlite3
+
+import pytest
+from fastapi import HTTPException
+
+import api.main as main
+
+
+@pytest.fixture
+def ingestion(monkeypatch):
+    monkeypatch.setattr(main, "interaction_queue", [])
+    monkeypatch.setattr(main, "interaction_retry", None)
+    monkeypatch.setattr(main, "interaction_flush_needed", asyncio.Event())
+    written = []
+    monkeypatch.setattr(main, "record_interactions", written.append)
+    return written
+
+
+def _failing(error, calls):
+    def record(batch):
+        calls.append(batch)
+        raise error
+    return record
+
+
+def test_locked_database_is_retried_then_dropped(ingestion, monkeypatch):
+    calls = []
+    monkeypatch.setattr(main, "record_interactions", _failing(sqlite3.OperationalError("database is locked"), calls))
+    monkeypatch.setattr(main, "INGEST_MAX_RETRIES", 2)
+    main.interaction_queue.append(("u1", "p1", "view"))
+
+    for _ in range(5):
+        asyncio.run(main.flush_interactions())
+
+    assert len(calls) == 3 # The first attempt and two retries
+    assert main.interaction_retry is None
+    assert main.interaction_queue == []
+
+
+def test_other_operational_errors_are_not_retried(ingestion, monkeypatch):
+    calls = []
+    monkeypatch.setattr(main, "record_interactions", _failing(sqlite3.OperationalError("no such table: x"), calls))
+    main.interaction_queue.append(("u1", "p1", "view"))
+
+    asyncio.run(main.flush_interactions())
+    asyncio.run(main.flush_interactions())
+
+    assert len(calls) == 1
+    assert main.interaction_retry is None
+
+
+def test_retried_batch_is_written_before_the_queue(ingestion, monkeypatch):
+    main.interaction_retry = ([("u1", "p1", "view")], 1)
+    main.interaction_queue.append(("u2", "p2", "view"))
+
+    asyncio.run(main.flush_interactions())
+
+    assert ingestion == [[("u1", "p1", "view")], [("u2", "p2", "view")]]
+    assert main.interaction_queue == []
+
+
+def test_full_queue_returns_503(ingestion, monkeypatch):
+    monkeypatch.setattr(main, "INGEST_MAX_QUEUE", 2)
+    events = [main.InteractionIn(user_id="u1", product_id="p1")] * 2
+    asyncio.run(main.ingest_interactions(events))
+
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(main.ingest_interactions(events[:1]))
+    assert raised.value.status_code == 503
+    assert len(main.interaction_queue) == 2
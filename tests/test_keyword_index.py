@@ -0,0 +1,67 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import api.recommender as recommender_module
+
+PRODUCTS = [
+    ("p1", "Alisha Solid Women's Cycling Shorts", "Clothing", "Cotton shorts for women, ideal for cycling."),
+    ("p2", "Men's Leather Wallet", "Accessories", "A slim wallet in genuine leather."),
+    ("p3", "Leather Wallets Combo", "Accessories", "Two wallets, brown and black."),
+    ("p4", "Steel Water Bottle", "Kitchen", "Keeps water cold. 3.5 inch base, 750ml."),
+    ("p5", "Road Bike Helmet", "Sports", "Lightweight helmet with 12 vents (women) and a visor."),
+    ("p6", "Sports Bra", "Clothing", "Women's sports bra with racerback straps."),
+    ("p7", "Running Shoes", "Footwear", "Mesh running shoe, size 9. Pair of shoes."),
+    ("p8", "Coffee Mug", "Kitchen", "Ceramic mug. Microwave safe; mugs come boxed."),
+    ("p9", "Yoga Mat", "Sports", "Non-slip mat for yoga and pilates, 6mm thick."),
+    ("p10", "Kids T-Shirt", "Clothing", "Printed t-shirt for kids; 100% cotton tee."),
+    ("p11", "Cushion Cover Set", "Home & Kitchen", "Set of 5 cushion covers for the living room sofa."),
+    ("p12", "Table Lamp", "Home & Kitchen", "Bedside table lamp with fabric shade."),
+]
+
+KEYWORDS = [
+    # Plural and singular nouns
+    "wallet", "wallets", "shoe", "shoes", "mug", "mugs", "helmet", "cushions", "covers", "lamp",
+    # Apostrophes
+    "women's", "men's", "womens",
+    # Multi-word terms
+    "water bottle", "sports bra", "living room", "table lamps", "running shoe",
+    # Regex metacharacters and punctuation
+    "3.5", "(women)", "t-shirt", "mug.", "100%",
+    # Case and absent terms
+    "LEATHER", "Yoga", "ottoman",
+]
+
+
+@pytest.fixture(scope="module")
+def recommender(tmp_path_factory):
+    db_path = tmp_path_factory.mktemp("catalog") / "db.sqlite3"
+    conn = sqlite3.connect(db_path)
+    pd.DataFrame(PRODUCTS, columns=["product_id", "name", "category", "description"]).to_sql(
+        recommender_module.PRODUCTS_TABLE_NAME, conn, index=False
+    )
+    conn.close()
+
+    original_path = recommender_module.DB_PATH
+    recommender_module.DB_PATH = str(db_path)
+    try:
+        yield recommender_module.Recommender()
+    finally:
+        recommender_module.DB_PATH = original_path
+
+
+def _regex_rows(recommender, keyword):
+    """The rows the original per-term regex scan over the whole catalog matched."""
+    singular_keyword = recommender_module.p.singular_noun(keyword) or keyword
+    search_regex = r'\b({}|{})\b'.format(singular_keyword, keyword)
+    soup = recommender._soup(np.arange(len(recommender.df)))
+    return np.flatnonzero(soup.str.contains(search_regex, case=False, na=False).to_numpy())
+
+
+@pytest.mark.parametrize("keyword", KEYWORDS)
+def test_keyword_rows_match_regex_scan(recommender, keyword):
+    expected = _regex_rows(recommender, keyword)
+    assert recommender._keyword_rows(keyword).tolist() == expected.tolist()
+
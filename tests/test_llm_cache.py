@@ -0,0 +1,30 @@
+import time
+
+from api.llm_cache import LLMCache
+
+
+def test_memory_tier_expires_entries(tmp_path):
+    cache = LLMCache(db_path=str(tmp_path / "cache.sqlite3"), ttl_seconds=60)
+    cache.set("key", "value")
+    assert cache.get("key") == "value"
+
+    # Age the entry in both tiers past the TTL
+    cache._memory["key"] = ("value", time.time() - 120)
+    conn = cache._connection()
+    conn.execute('UPDATE llm_cache SET created_at = ?', (time.time() - 120,))
+    conn.commit()
+
+    assert cache.get("key") is None
+    assert cache.get_stats()["memory_entries"] == 0
+
+
+def test_disk_hit_keeps_its_original_age(tmp_path):
+    cache = LLMCache(db_path=str(tmp_path / "cache.sqlite3"), ttl_seconds=60)
+    cache.set("key", "value")
+    conn = cache._connection()
+    conn.execute('UPDATE llm_cache SET created_at = ?', (time.time() - 30,))
+    conn.commit()
+    cache._memory.clear()
+
+    assert cache.get("key") == "value" # Promoted from disk
+    assert cache._memory["key"][1] < time.time() - 29
@@ -0,0 +1,102 @@
+import pytest
+
+import api.recommender as recommender_module
+from api.profiles import ProfileCache, UserProfile
+from benchmarks.synthetic import generate_database
+
+
+def test_load_without_overlapping_write_is_cached():
+    cache = ProfileCache()
+    load = cache.begin_load("u1")
+    profile = UserProfile()
+    assert cache.finish_load("u1", load, profile)
+    with cache.lock:
+        assert cache.get("u1") is profile
+
+
+def test_load_overlapping_a_write_is_not_cached():
+    cache = ProfileCache()
+    load = cache.begin_load("u1")
+    cache.begin_write({"u1"})
+    cache.end_write({"u1"})
+    assert not cache.finish_load("u1", load, UserProfile())
+    with cache.lock:
+        assert cache.get("u1") is None
+
+
+def test_load_started_during_a_write_is_not_cached():
+    cache = ProfileCache()
+    cache.begin_write({"u1"})
+    load = cache.begin_load("u1")
+    cache.end_write({"u1"})
+    assert not cache.finish_load("u1", load, UserProfile())
+
+
+def test_writes_for_other_users_do_not_affect_a_load():
+    cache = ProfileCache()
+    load = cache.begin_load("u1")
+    cache.begin_write({"u2"})
+    assert cache.finish_load("u1", load, UserProfile())
+    cache.end_write({"u2"})
+
+
+def test_clear_invalidates_loads_in_progress():
+    cache = ProfileCache()
+    load = cache.begin_load("u1")
+    with cache.lock:
+        cache.clear()
+    assert not cache.finish_load("u1", load, UserProfile())
+
+
+def test_failed_load_is_not_cached():
+    cache = ProfileCache()
+    load = cache.begin_load("u1")
+    assert not cache.finish_load("u1", load, None)
+    assert len(cache) == 0
+
+
+@pytest.fixture
+def recommender(tmp_path, monkeypatch):
+    db_path = tmp_path / "db.sqlite3"
+    generate_database(str(db_path), 200)
+    monkeypatch.setattr(recommender_module, "DB_PATH", str(db_path))
+    return recommender_module.Recommender()
+
+
+def _history_loader(histories, calls):
+    def load_history(user_id):
+        calls.append(user_id)
+        return list(histories[user_id])
+    return load_history
+
+
+def test_cached_profile_is_reused_until_a_newer_interaction(recommender):
+    histories, calls = {"u1": [("syn00000001", "view")]}, []
+    load_history = _history_loader(histories, calls)
+
+    assert recommender.recommend_for_user("u1", load_history, last_interaction_id=5)
+    assert recommender.recommend_for_user("u1", load_history, last_interaction_id=5)
+    assert calls == ["u1"]
+
+    # Another worker recorded an event for u1
+    histories["u1"].append(("syn00000002", "purchase"))
+    recommender.recommend_for_user("u1", load_history, last_interaction_id=6)
+    assert calls == ["u1", "u1"]
+    with recommender.profiles.lock:
+        profile = recommender.profiles.get("u1")
+    assert profile.last_interaction_id == 6
+    assert len(profile.history) == 2
+
+
+def test_locally_recorded_events_keep_the_profile_current(recommender):
+    calls = []
+    load_history = _history_loader({"u1": [("syn00000001", "view")]}, calls)
+    recommender.recommend_for_user("u1", load_history, last_interaction_id=5)
+
+    events = [("u1", "syn00000002", "view"), ("u2", "syn00000003", "view")]
+    recommender.profiles.begin_write({"u1", "u2"})
+    recommender.record_user_events(events, [6, 7])
+    recommender.profiles.end_write({"u1", "u2"})
+
+    recommender.recommend_for_user("u1", load_history, last_interaction_id=6)
+    assert calls == ["u1"]
@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+from seed_data import clean_categories, clean_category
+
+CATEGORY_TREES = [
+    # Well-formed single-entry trees, the common case
+    '["Clothing >> Women\'s Clothing >> Shorts"]',
+    ' \t["Home & Kitchen >> Dining"]\n',
+    '["Footwear"]',
+    '["A>>>B"]',
+    '["A >>"]',
+    '[""]',
+    # Several entries
+    '["A", "B"]',
+    '["A >> B", "C >> D"]',
+    # Escapes and characters json.loads rejects inside a string
+    '["A\\"B >> C"]',
+    '["A\\u0041 >> B"]',
+    '["A", "B\\q"]',
+    '["A\tB"]',
+    '["A\nB"]',
+    '["A\x00B"]',
+    # Malformed lists
+    '["A", ]',
+    '["A" , x]',
+    '[ "A" ]x',
+    '["A"',
+    '["A>"]',
+    '[]',
+    '\x0b["A"]',
+    'not json',
+    '',
+]
+
+
+@pytest.mark.parametrize("raw", CATEGORY_TREES)
+def test_clean_categories_matches_clean_category(raw):
+    assert clean_categories(pd.Series([raw])).tolist() == [clean_category(raw)]
+
+
+def test_clean_categories_keeps_the_index():
+    raw = pd.Series(['["A >> B"]', '["A", ]'], index=[10, 20])
+    assert clean_categories(raw).to_dict() == {10: 'A', 20: 'Uncategorized'}